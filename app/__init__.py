@@ -1,2 +1,25 @@
-from .camerado import CameradoApplication
+import importlib
 
+# Tk and PIL are only loaded when the application is actually used:
+_EXPORTS = {
+    'CameradoApplication': 'camerado',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+
+    if name not in _EXPORTS:
+        raise AttributeError('module {m!r} has no attribute {n!r}'.format(
+            m=__name__, n=name))
+
+    module = importlib.import_module('.' + _EXPORTS[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
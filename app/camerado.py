@@ -1,21 +1,34 @@
 import os
-import time
 import json
+import time
 import tkinter as tk
-from threading import Lock
+from threading import Thread, Lock
 from tkinter import messagebox, filedialog
 
-from PIL import Image, ImageTk
-
 from .device import DeviceSettingsFrame
-from video import VideoStream, VideoDeviceSettings
+from .preview import PreviewRenderer
+import video
+from video import VideoFrameCounter, VideoDeviceSettings, \
+    VideoDeviceDiscovery, VideoFrameBuffer
 
 
 class CameradoApplication(tk.Tk):
 
     MAX_ROI = 10
-    UPDATE_DELAY = 50
-    STREAM_CLOSE_DELAY = 2
+    PREVIEW_FPS = 30
+    PREVIEW_RATES = (10, 15, 30, 60)
+    MOTION_GATING = False
+    MOTION_THRESHOLD = 3
+    PREVIEW_RAW = True
+    BUFFER_FRAMES = 300
+    BUFFER_BYTES = 256 * 2 ** 20
+    BUFFER_SAVE_SECONDS = 5
+    RECORD_FPS = 30
+    RECORD_QUEUE_SIZE = 64
+    RECORD_DROP_POLICY = 'drop-oldest'
+    PROBE_POLL_DELAY = 100
+    STREAM_POLL_DELAY = 50
+    IDLE_POLL_DELAY = 100
     CANVAS_SIZE = (640, 480)
     DEFAULT_RESOLUTIONS = [(640, 480), (800, 600), (1024, 768), (1600, 1200)]
 
@@ -24,26 +37,89 @@ class CameradoApplication(tk.Tk):
         self.title('Camerado')
 
         self.device_settings_frame = None
+        self.grid_view_frame = None
         self.device_path = tk.StringVar(self, value='')
         self.resolution = tk.StringVar(self, value='')
         self.roi_spinbox_num = tk.StringVar(self, value='')
+        self.show_stats = tk.BooleanVar(self, value=False)
+        self.preview_fps = tk.IntVar(self, value=self.PREVIEW_FPS)
+        self.motion_gating = tk.BooleanVar(self, value=self.MOTION_GATING)
+        self.motion = None
+        self.counter = VideoFrameCounter()
         self.create_widgets()
 
+        self.stream = None
+        self.settings = None
+        self.open_thread = None
+        self.open_result = None
+        self.open_pending = None
+        self.open_cancelled = False
+        self.recorder = None
+        self.displayed_frame = None
+        self.preview_seq = 0
+        self.preview_skipped = 0
+        self.preview_size = None
+        self.overlay_state = None
+        self.scrub_position = None
+        self.t_preview = 0
+        self.canvas_job = None
+        self.canvas_due = None
+        self.buffer = VideoFrameBuffer(self.BUFFER_FRAMES, self.BUFFER_BYTES)
         self.stream_lock = Lock()
         self.roi_lock = Lock()
         self.reset_stream()
 
-        self.update_device_menu()
-        self.update_canvas()
+        self.discovery = VideoDeviceDiscovery()
+        self.probe_thread = None
+        self.probe_result = None
+
+        # The capture thread wakes the Tk loop up through a pipe whenever a
+        # frame arrives, at most one byte is in flight at a time:
+        self.wake_r, self.wake_w = os.pipe()
+        self.wake_lock = Lock()
+        os.set_blocking(self.wake_r, False)
+        self.frame_pending = False
+        self.tk.createfilehandler(self.wake_r, tk.READABLE, self.frame_ready)
 
         self.last_dir = None
         self.home_dir = os.path.expanduser('~')
 
+        # Idle callbacks run in order, so the window is drawn before the
+        # devices are probed and the preview starts:
+        self.after_idle(self.startup)
+
+    def startup(self):
+        self.update_device_menu()
+        self.update_canvas()
+
+    def destroy(self):
+
+        # The capture thread may still deliver a frame, it must not write to
+        # a closed (or by then reused) file descriptor:
+        with self.wake_lock:
+
+            if self.wake_w is not None:
+                self.tk.deletefilehandler(self.wake_r)
+                os.close(self.wake_r)
+                os.close(self.wake_w)
+                self.wake_r = self.wake_w = None
+
+        super().destroy()
+
     def reset_stream(self):
 
         with self.stream_lock:
+
+            if self.stream is not None:
+                Thread(target=self.stream.release, daemon=True).start()
+
             self.stream = None
 
+        self.buffer.clear()
+        self.displayed_frame = None
+        self.overlay_state = None
+        self.playback.pack_forget()
+
         with self.roi_lock:
             self.roi_list = [None] * self.MAX_ROI
             self.roi_tmp = None
@@ -58,25 +134,62 @@ class CameradoApplication(tk.Tk):
                               command=self.load_settings)
         file_menu.add_command(label='Save', accelerator='<Ctrl-S>',
                               command=self.save_settings)
+        file_menu.add_command(label='Dump Statistics',
+                              command=self.dump_statistics)
         file_menu.add_separator()
         file_menu.add_command(label='Quit', accelerator='<Alt-F4>',
                               command=self.destroy)
 
         menu.add_cascade(label='File', menu=file_menu)
+
+        view_menu = tk.Menu(menu, tearoff=0)
+        view_menu.add_checkbutton(label='Statistics', accelerator='<F2>',
+                                  variable=self.show_stats)
+
+        rate_menu = tk.Menu(view_menu, tearoff=0)
+
+        for fps in self.PREVIEW_RATES:
+            rate_menu.add_radiobutton(label='{f} fps'.format(f=fps),
+                                      value=fps, variable=self.preview_fps)
+
+        view_menu.add_cascade(label='Preview Rate', menu=rate_menu)
+        view_menu.add_checkbutton(label='Motion Gating',
+                                  variable=self.motion_gating)
+        view_menu.add_command(label='Camera Grid', command=self.grid_view)
+
+        menu.add_cascade(label='View', menu=view_menu)
         self.config(menu=menu)
 
         # Key bindings:
         self.bind('<Control-l>', func=lambda _: self.load_settings())
         self.bind('<Control-s>', func=lambda _: self.save_settings())
         self.bind('<Alt-F4>', func=lambda _: self.destroy())
+        self.bind('<F2>', func=lambda _: self.show_stats.set(
+            not self.show_stats.get()))
 
         # Video canvas:
+        view = tk.Frame(self)
+        view.pack(side='left', fill='both', expand=True)
+
         w, h = self.CANVAS_SIZE
-        self.canvas = tk.Canvas(self, width=w, height=h, bg='gray')
+        self.canvas = tk.Canvas(view, width=w, height=h, bg='gray')
         self.canvas.pack(
-            side='left', fill='both', expand=True, padx=5, pady=5)
+            side='top', fill='both', expand=True, padx=5, pady=5)
         self.canvas.bind('<Button-1>', self.mouse_click)
         self.canvas.bind('<B1-Motion>', self.mouse_drag)
+        self.renderer = PreviewRenderer(self.canvas, self.MAX_ROI)
+
+        # Playback bar, only shown for video files. The scale also steps
+        # frame by frame with the arrow keys:
+        self.playback = tk.Frame(view)
+        self.play_button = tk.Button(self.playback, text='Pause', width=5,
+            command=self.toggle_playback)
+        self.play_button.pack(
+            side='left', padx=5)
+        self.scrub_scale = tk.Scale(self.playback, orient='horizontal',
+            showvalue=False, from_=0, to=0, command=self.scrub)
+        self.scrub_scale.pack(
+            side='left', fill='x', expand=True, padx=5)
 
         # Right panel:
         panel = tk.Frame(self)
@@ -148,33 +261,243 @@ class CameradoApplication(tk.Tk):
         tk.Button(panel, text='Snapshot', command=self.snapshot).pack(
             fill='x', padx=5, pady=5)
 
+        tk.Button(panel, text='Save Last Seconds',
+            command=self.save_buffer).pack(
+            fill='x', padx=5, pady=5)
+
+        # Record button:
+        self.record_button = tk.Button(panel, text='Record',
+            command=self.toggle_recording)
+        self.record_button.pack(
+            fill='x', padx=5, pady=5)
+
     def current_canvas_size(self):
         w = self.canvas.winfo_width()
         h = self.canvas.winfo_height()
 
         return (w, h)
 
+    def notify_frame(self, frame):
+        # Called on the capture thread:
+        with self.wake_lock:
+
+            if not self.frame_pending and self.wake_w is not None:
+                self.frame_pending = True
+                os.write(self.wake_w, b'\0')
+
+    def frame_ready(self, fd, mask):
+
+        try:
+            os.read(fd, 64)
+        except BlockingIOError:
+            pass
+
+        self.frame_pending = False
+
+        # Frames are shown no faster than the target rate. Whatever arrives
+        # in between is skipped, the next redraw takes the newest frame:
+        period = 1 / self.preview_fps.get()
+        self.request_canvas(self.t_preview + period - time.monotonic())
+
+    def request_canvas(self, delay):
+        delay = max(delay, 0)
+        due = time.monotonic() + delay
+
+        if self.canvas_job is not None:
+
+            if self.canvas_due <= due:
+                return
+
+            self.after_cancel(self.canvas_job)
+
+        self.canvas_due = due
+        self.canvas_job = self.after(int(1000 * delay), self.update_canvas)
+
     def update_canvas(self):
+        self.canvas_job = None
+
+        self.check_recording()
 
         if self.stream is not None:
             size = self.current_canvas_size()
 
             with self.stream_lock:
-                frame = self.stream.read(size)
+                frame = self.stream.latest()
+
+            if frame is not None and frame.seq != self.preview_seq:
+                self.t_preview = time.monotonic()
+
+                if self.preview_seq:
+                    self.preview_skipped += max(
+                        frame.seq - self.preview_seq - 1, 0)
+
+                self.preview_seq = frame.seq
+
+                # A corrupt frame is skipped, the previous one stays on the
+                # canvas:
+                try:
+                    self.render_frame(frame, size)
+                except video.FrameError:
+                    self.preview_skipped += 1
+
+            if self.displayed_frame is not None:
+                self.draw_overlays(self.preview_label())
+
+            if self.stream.is_seekable:
+                self.update_playback()
+
+            if self.show_stats.get():
+                self.renderer.draw_stats(self.preview_summary())
+            else:
+                self.renderer.draw_stats(None)
+
+        elif self.open_thread is not None:
+            # Keep showing the previous frame until the new stream delivers:
+            self.renderer.draw_label('Switching...')
+            self.overlay_state = None
+
+        # New frames schedule the next redraw themselves, this only keeps the
+        # overlays up to date while none arrive:
+        self.request_canvas(self.IDLE_POLL_DELAY / 1000)
+
+    def render_frame(self, frame, size):
+        # Frames which look the same as the one on the canvas are not
+        # rendered again, unless the canvas has been resized:
+        changed = True
+
+        # Every ROI is compared with its own reference, so the detector
+        # starts over whenever the ROIs change:
+        roi_list = self.get_camera_roi()
 
-            if frame is not None:
-                img = Image.fromarray(frame)
-                self.photo = ImageTk.PhotoImage(img)
-                self.canvas.create_image(0, 0, image=self.photo, anchor='nw')
+        if self.motion is None or self.motion.roi.roi_list != roi_list:
+            self.motion = video.VideoMotionDetector(self.MOTION_THRESHOLD,
+                                                    roi_list)
 
-                width, height = self.stream.size
-                self.canvas.create_text(
-                    15, 15, fill='yellow', font='Helvetica 10', anchor='w',
-                    text='Res. {w}x{h}'.format(w=width, h=height))
+        # A paused file only gets new frames by seeking, and every one of
+        # them is shown so that the label matches the picture:
+        paused = self.stream.is_seekable and not self.stream.is_playing
 
-                self.draw_roi_boxes()
+        if self.motion_gating.get() and size == self.preview_size and \
+                not paused:
 
-        self.after(self.UPDATE_DELAY, self.update_canvas)
+            with self.counter.measure('motion'):
+                changed = self.motion.update(frame)
+
+        else:
+            self.motion.reset()
+
+        if not changed:
+            return False
+
+        with self.counter.measure('resize'):
+            resized = frame.resize(size)
+
+        with self.counter.measure('convert'):
+            rgb = resized.rgb()
+
+        with self.counter.measure('photo'):
+            self.renderer.draw_frame(rgb)
+
+        # Snapshots are taken from the frame on the canvas:
+        self.displayed_frame = frame
+        self.preview_size = size
+
+        # From capture (or receipt) to the frame being on the canvas:
+        age = frame.age()
+
+        if age is not None:
+            self.counter.add('latency', age)
+
+        self.counter.tick('preview')
+
+        return True
+
+    def preview_label(self):
+        width, height = self.stream.size
+        label = 'Res. {w}x{h}'.format(w=width, h=height)
+
+        if self.stream.is_seekable:
+            label += '  Frame {p}/{n}  {t:.3f} s'.format(
+                p=self.stream.position + 1,
+                n=self.stream.frame_count,
+                t=self.displayed_frame.timestamp or 0)
+
+        if self.recorder is not None:
+            label += '  REC {written} frames, {dropped} dropped, ' \
+                'lag {lag:.0f} ms'.format(**self.recorder.status())
+
+        return label
+
+    def draw_overlays(self, label):
+        # The overlays are canvas items of their own, a new frame does not
+        # paint over them. So they are only redrawn when they change, e.g.
+        # not at all for an unchanged frame of a live camera:
+        with self.roi_lock:
+            state = (label, self.current_canvas_size(),
+                     self.roi_spinbox_num.get(), self.roi_is_updating,
+                     tuple(tuple(r) if r else None for r in self.roi_list),
+                     tuple(self.roi_tmp or ()))
+
+        if state == self.overlay_state:
+            return
+
+        self.overlay_state = state
+
+        with self.counter.measure('draw'):
+            self.renderer.draw_label(label)
+            self.draw_roi_boxes()
+
+    def update_playback(self):
+        self.play_button['text'] = \
+            'Pause' if self.stream.is_playing else 'Play'
+
+        # While paused, the scale is where the user left it:
+        position = self.stream.position
+
+        if self.stream.is_playing and position != self.scrub_position:
+            self.scrub_position = position
+            self.scrub_scale.set(position)
+
+    def toggle_playback(self):
+
+        if self.stream is None or not self.stream.is_seekable:
+            return
+
+        if self.stream.is_playing:
+            self.stream.pause()
+        else:
+            self.stream.play()
+
+    def scrub(self, value):
+        position = int(float(value))
+
+        # Setting the scale from update_playback() calls this as well:
+        if self.stream is None or not self.stream.is_seekable or \
+                position == self.scrub_position:
+            return
+
+        self.scrub_position = position
+        self.stream.pause()
+        self.stream.seek(position)
+
+    def preview_summary(self):
+        line = 'preview {a:.1f}/{t} fps, capture {c:.1f} fps, ' \
+            '{s} skipped'.format(a=self.counter.rate('preview') or 0,
+                                 t=self.preview_fps.get(),
+                                 c=self.counter.rate('capture') or 0,
+                                 s=self.preview_skipped)
+
+        if self.stream is not None and self.stream.is_seekable:
+            line += '\ncache {frames} frames, {mib:.0f} MiB, {hits} hits, ' \
+                '{misses} misses'.format(
+                    mib=self.stream.cache.nbytes / 2 ** 20,
+                    **self.stream.cache.status())
+
+        if self.motion_gating.get() and self.motion is not None:
+            line += '\nmotion gating: {s} of {c} frames unchanged'.format(
+                s=self.motion.skipped, c=self.motion.checked)
+
+        return line + '\n' + self.counter.summary()
 
     def draw_roi_boxes(self):
         update_i = int(self.roi_spinbox_num.get())
@@ -185,30 +508,17 @@ class CameradoApplication(tk.Tk):
             for i, roi in enumerate(self.roi_list, start=1):
 
                 if roi is None:
+                    self.renderer.hide_roi(i - 1)
                     continue
 
                 roi = [roi[0] * w, roi[1] * h, roi[2] * w, roi[3] * h]
 
                 if self.roi_is_updating and i == update_i:
-                    color = 'red'
-                    self.canvas.create_rectangle(roi,
-                                                 outline=color,
-                                                 dash=(4, 4),
-                                                 width=2)
+                    self.renderer.draw_roi(i - 1, roi, 'red', dash=(4, 4))
                 else:
-                    color = 'blue'
-                    self.canvas.create_rectangle(roi,
-                                                 outline=color,
-                                                 width=2)
-
-                self.canvas.create_text(roi[0], roi[1] - 10,
-                    fill=color, font='Helvetica 10', anchor='w',
-                    text='ROI {i}'.format(i=i))
+                    self.renderer.draw_roi(i - 1, roi, 'blue')
 
-            if self.roi_tmp is not None:
-                self.canvas.create_rectangle(self.roi_tmp,
-                                             outline='blue',
-                                             width=2)
+            self.renderer.draw_roi_tmp(self.roi_tmp)
 
     def roi_list_update(self):
 
@@ -275,19 +585,51 @@ class CameradoApplication(tk.Tk):
                 self.roi_list[i] = roi
 
     def update_device_menu(self):
+        # Show the devices known from the previous runs right away, and
+        # replace them with the actual ones once probing has finished:
+        self.fill_device_menu(self.discovery.cached())
+
+        if self.probe_thread is None or not self.probe_thread.is_alive():
+            self.probe_result = None
+            self.probe_thread = Thread(target=self.probe_devices, daemon=True)
+            self.probe_thread.start()
+            self.check_probe()
+
+    def probe_devices(self):
+
+        try:
+            self.probe_result = self.discovery.probe()
+        except Exception as e:
+            self.probe_result = e
+
+    def check_probe(self):
+
+        if self.probe_result is None:
+            self.after(self.PROBE_POLL_DELAY, self.check_probe)
+        elif isinstance(self.probe_result, Exception):
+            # The menu keeps the cached devices:
+            error = self.probe_result
+            self.probe_result = None
+            messagebox.showerror('Error', 'Failed to probe video devices: '
+                                 '{e}'.format(e=error))
+        else:
+            self.fill_device_menu(self.probe_result)
+
+    def fill_device_menu(self, dev_list):
         menu = self.device_menu['menu']
         menu.delete(0, 'end')
 
-        dev_list = VideoDeviceSettings.device_list()
-
         if dev_list:
 
             for dev in dev_list:
                 menu.add_command(
-                    label=dev,
-                    command=lambda val=dev: self.device_path.set(val))
+                    label='{p} ({c})'.format(p=dev['path'], c=dev['card']),
+                    command=lambda val=dev['path']: self.device_path.set(val))
 
-            self.device_path.set(dev_list[0])
+            paths = [dev['path'] for dev in dev_list]
+
+            if self.device_path.get() not in paths:
+                self.device_path.set(paths[0])
 
     def update_resolution_menu(self):
         menu = self.resolution_menu['menu']
@@ -299,7 +641,8 @@ class CameradoApplication(tk.Tk):
         if self.settings is None:
             res_list = self.DEFAULT_RESOLUTIONS
         else:
-            res_list = self.settings.get_resolutions()
+            res_list = self.discovery.resolutions(self.stream.path) or \
+                self.settings.get_resolutions()
 
         res_names = ['{w}x{h}'.format(w=w, h=h) for w, h in res_list]
 
@@ -323,29 +666,102 @@ class CameradoApplication(tk.Tk):
 
         self.create_stream(self.stream.path, size)
 
-    def create_stream(self, path, size):
+    def create_stream(self, path, size, on_ready=None):
+        self.stop_recording()
+
+        # Only the latest request matters if the user keeps switching while a
+        # stream is still being opened:
+        if self.open_thread is not None:
+            self.open_pending = (path, size, on_ready)
+            return
+
+        with self.stream_lock:
+            old_stream = self.stream
+            self.stream = None
+
+        self.settings = None
+        self.open_result = None
+        self.open_thread = Thread(target=self.open_stream,
+                                  args=(old_stream, path, size), daemon=True)
+        self.open_thread.start()
+        self.check_stream(on_ready)
+
+    def open_stream(self, old_stream, path, size):
 
         try:
 
-            with self.stream_lock:
-                self.stream = None
-                time.sleep(self.STREAM_CLOSE_DELAY)
-                self.stream = VideoStream(path, size)
+            if old_stream is not None:
+                old_stream.release()
 
-            if self.stream.path.startswith('/dev/'):
-                self.settings = VideoDeviceSettings(path)
+            # Video files are opened for seeking and scrubbing:
+            if os.path.isfile(path):
+                stream_class = video.VideoFileStream
             else:
-                self.settings = None
-
-            self.update_resolution_menu()
+                stream_class = video.VideoStream
 
+            self.open_result = stream_class.open(
+                path, size, counter=self.counter, raw=self.PREVIEW_RAW)
         except Exception as e:
-            messagebox.showerror('Error', str(e))
+            self.open_result = e
 
-            with self.stream_lock:
-                self.stream = None
+    def check_stream(self, on_ready):
+
+        if self.open_result is None:
+            self.after(self.STREAM_POLL_DELAY, self.check_stream, on_ready)
+            return
+
+        result = self.open_result
+        self.open_thread = None
+
+        if self.open_cancelled:
+            self.open_cancelled = False
+
+            if not isinstance(result, Exception):
+                Thread(target=result.release, daemon=True).start()
 
-            self.settings = None
+        elif isinstance(result, Exception):
+            self.playback.pack_forget()
+            messagebox.showerror('Error', str(result))
+        else:
+
+            try:
+
+                if result.is_device:
+                    self.settings = VideoDeviceSettings(result.path)
+
+                with self.stream_lock:
+                    self.stream = result
+
+                self.counter.reset()
+                self.buffer.clear()
+                self.displayed_frame = None
+                self.overlay_state = None
+                self.preview_seq = 0
+                self.preview_skipped = 0
+                self.preview_size = None
+                result.subscribe(self.buffer.put)
+                result.subscribe(self.notify_frame)
+
+                self.update_resolution_menu()
+
+                if result.is_seekable:
+                    self.scrub_position = None
+                    self.scrub_scale.config(to=result.frame_count - 1)
+                    self.playback.pack(side='bottom', fill='x', pady=5,
+                                       before=self.canvas)
+                else:
+                    self.playback.pack_forget()
+
+                if on_ready is not None:
+                    on_ready()
+
+            except Exception as e:
+                messagebox.showerror('Error', str(e))
+
+        if self.open_pending is not None:
+            pending = self.open_pending
+            self.open_pending = None
+            self.create_stream(*pending)
 
     def load_settings(self):
 
@@ -365,9 +781,12 @@ class CameradoApplication(tk.Tk):
             cfg = json.load(f)
 
         self.close_device_settings_frame()
-        self.create_stream(cfg['path'], tuple(cfg['resolution']))
+        self.create_stream(cfg['path'], tuple(cfg['resolution']),
+                           on_ready=lambda: self.apply_settings(cfg))
         self.device_path.set(cfg['path'])
 
+    def apply_settings(self, cfg):
+
         if cfg['settings'] is not None:
             self.settings.set(cfg['settings'])
 
@@ -404,6 +823,22 @@ class CameradoApplication(tk.Tk):
         with open(filename, 'w') as f:
             json.dump(cfg, f, indent=2)
 
+    def dump_statistics(self):
+
+        filename = filedialog.asksaveasfilename(
+            initialdir=self.last_dir or self.home_dir,
+            title='Save file',
+            filetypes=[('json', '*.json')])
+
+        if not filename:
+            self.last_dir = None
+            return
+
+        print('Dump statistics to', filename)
+        self.last_dir = os.path.dirname(filename)
+
+        self.counter.dump(filename)
+
     def settings_frame(self):
 
         if self.stream is None:
@@ -436,6 +871,46 @@ class CameradoApplication(tk.Tk):
             self.device_settings_frame.destroy()
             self.device_settings_frame = None
 
+    def grid_view(self):
+
+        if self.grid_view_frame is not None:
+            self.grid_view_frame.focus()
+            return
+
+        paths = [dev['path'] for dev in
+                 self.probe_result or self.discovery.cached()]
+
+        if not paths:
+            messagebox.showinfo('Info', 'No video devices found.')
+            return
+
+        # A device can only be streamed by one capture at a time, so the
+        # grid takes over from the single camera preview:
+        self.close_device_path()
+
+        self.grid_view_frame = tk.Toplevel(self)
+        self.grid_view_frame.title('Camera Grid')
+        self.grid_view_frame.protocol(
+            'WM_DELETE_WINDOW', self.close_grid_view)
+
+        # The grid needs NumPy and OpenCV right away, so it is only loaded
+        # when opened:
+        from .grid import GridViewFrame
+
+        try:
+
+            GridViewFrame(paths, self.grid_view_frame)
+
+        except Exception as e:
+            self.close_grid_view()
+            messagebox.showerror('Error', str(e))
+
+    def close_grid_view(self):
+
+        if self.grid_view_frame is not None:
+            self.grid_view_frame.destroy()
+            self.grid_view_frame = None
+
     def open_device_path(self, event=None):
         path = self.device_path.get()
 
@@ -446,7 +921,13 @@ class CameradoApplication(tk.Tk):
         self.open_path_button.config(state='disabled')
 
     def close_device_path(self):
-        self.canvas.delete('all')
+
+        if self.open_thread is not None:
+            self.open_cancelled = True
+            self.open_pending = None
+
+        self.stop_recording()
+        self.renderer.clear()
         self.open_path_button.config(state='normal')
         self.close_device_settings_frame()
         self.reset_stream()
@@ -454,14 +935,11 @@ class CameradoApplication(tk.Tk):
         self.resolution.set('')
 
     def snapshot(self):
+        # Save the full-resolution frame the user is looking at, not the one
+        # which happens to arrive after the file dialog:
+        frame = self.displayed_frame
 
-        if self.stream is None:
-            return
-
-        with self.stream_lock:
-            frame = self.stream.read()
-
-        if frame is None:
+        if self.stream is None or frame is None:
             return
 
         filename = filedialog.asksaveasfilename(
@@ -475,18 +953,107 @@ class CameradoApplication(tk.Tk):
 
         self.last_dir = os.path.dirname(filename)
 
+        # Frames are shared with the capture thread and the other consumers,
+        # so draw the ROIs on a private, fully decoded copy:
+        try:
+            frame = frame.decode().copy()
+        except video.FrameError as e:
+            messagebox.showerror('Error', str(e))
+            return
+
         self.roi_list_rearrange()
-        roi_list = self.get_camera_roi()
+        roi_list = video.VideoROI(self.get_camera_roi())
 
-        for i, roi in enumerate(roi_list, start=1):
-            h, w = frame.shape[:2]
-            roi = [int(roi[0] * w), int(roi[1] * h),
-                   int(roi[2] * w), int(roi[3] * h)]
-            VideoStream.draw_box(frame, roi)
-            VideoStream.draw_text(frame, text='ROI {i}'.format(i=i),
+        for i, roi in enumerate(roi_list.pixel_boxes(frame.size), start=1):
+            video.VideoStream.draw_box(frame.data, roi)
+            video.VideoStream.draw_text(
+                frame.data, text='ROI {i}'.format(i=i),
                 anchor=(roi[0], roi[1] - 5), scale=0.5)
 
-        VideoStream.save(frame, filename)
+        video.VideoStream.save(frame, filename)
+
+    def save_buffer(self):
+
+        if self.stream is None:
+            return
+
+        # Take the frames right away, the dialog may stay open for a while:
+        frames = self.buffer.since(self.BUFFER_SAVE_SECONDS)
+
+        if not frames:
+            return
+
+        dirname = filedialog.askdirectory(
+            initialdir=self.last_dir or self.home_dir,
+            title='Save last {n} seconds to directory'.format(
+                n=self.BUFFER_SAVE_SECONDS))
+
+        if not dirname:
+            self.last_dir = None
+            return
+
+        self.last_dir = dirname
+
+        print('Save {n} frames to {d}'.format(n=len(frames), d=dirname))
+        Thread(target=VideoFrameBuffer.save, args=(frames, dirname),
+               daemon=True).start()
+
+    def toggle_recording(self):
+
+        if self.recorder is not None:
+            self.stop_recording()
+            return
+
+        if self.stream is None:
+            return
+
+        # Raw MJPEG streams are recorded as they are, anything else gets
+        # encoded:
+        if self.stream.raw:
+            filetypes = [('mjpeg', '*.mjpg'), ('avi', '*.avi')]
+        else:
+            filetypes = [('avi', '*.avi'), ('mjpeg', '*.mjpg')]
+
+        filename = filedialog.asksaveasfilename(
+            initialdir=self.last_dir or self.home_dir,
+            title='Record to file',
+            filetypes=filetypes)
+
+        if not filename or self.stream is None:
+            self.last_dir = None
+            return
+
+        self.last_dir = os.path.dirname(filename)
+
+        fps = self.stream.frame_rate() or self.RECORD_FPS
+        self.recorder = video.VideoRecorder(
+            filename, fps=fps, queue_size=self.RECORD_QUEUE_SIZE,
+            policy=self.RECORD_DROP_POLICY)
+        self.recorder.start()
+        self.stream.subscribe(self.recorder.put)
+        self.record_button.config(text='Stop Recording')
+
+    def stop_recording(self):
+
+        if self.recorder is None:
+            return
+
+        if self.stream is not None:
+            self.stream.unsubscribe(self.recorder.put)
+
+        # Flushing the queue may take a while, do not wait for it here:
+        Thread(target=self.recorder.stop, daemon=True).start()
+        self.recorder = None
+        self.record_button.config(text='Record')
+
+    def check_recording(self):
+
+        if self.recorder is None or self.recorder.error is None:
+            return
+
+        error = self.recorder.error
+        self.stop_recording()
+        messagebox.showerror('Error', 'Recording failed: {e}'.format(e=error))
 
     def mouse_click(self, event):
 
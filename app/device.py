@@ -1,15 +1,31 @@
 import tkinter as tk
 from functools import partial
+from queue import Empty
 from tkinter import messagebox
 
+from video import VideoSettingsWriter
+
 
 class DeviceSettingsFrame(tk.Frame):
 
+    WRITE_RATE = 20
+    FLUSH_TIMEOUT = 2
+    STOP_TIMEOUT = 0.5
+    ERROR_POLL_DELAY = 100
+
     def __init__(self, settings, master=None):
         super().__init__(master)
         self.settings = settings
+        self.writer = VideoSettingsWriter(settings, rate=self.WRITE_RATE)
         self.create_widgets()
 
+        self.writer.start()
+        # A hanging device must not freeze the window as it closes, the
+        # writer is a daemon thread and finishes on its own:
+        self.bind('<Destroy>',
+                  lambda _: self.writer.stop(self.STOP_TIMEOUT))
+        self.check_errors()
+
     def create_widgets(self):
         # Settings:
         set_list = self.settings.get()
@@ -17,7 +33,7 @@ class DeviceSettingsFrame(tk.Frame):
 
         for s in set_list:
 
-            if s.get('flags', '') == 'inactive':
+            if self.settings.is_inactive(s):
                 continue
 
             label_text = s['name'].replace('_', ' ')
@@ -101,6 +117,9 @@ class DeviceSettingsFrame(tk.Frame):
         for widget in self.master.pack_slaves():
             widget.destroy()
 
+        # Values still on their way to the device would be read back stale:
+        self.writer.flush(self.FLUSH_TIMEOUT)
+        self.settings.invalidate()
         self.create_widgets()
 
     def update_settings(self, name, value):
@@ -117,9 +136,19 @@ class DeviceSettingsFrame(tk.Frame):
         self.set_settings([ctr['settings']])
 
     def set_settings(self, vals):
+        self.writer.put_many(vals)
+
+    def check_errors(self):
+
+        if not self.writer.is_running:
+            return
 
         try:
-            self.settings.set(vals)
-        except Exception as e:
+            e = self.writer.errors.get_nowait()
+        except Empty:
+            pass
+        else:
             messagebox.showerror('Error', str(e))
 
+        self.after(self.ERROR_POLL_DELAY, self.check_errors)
+
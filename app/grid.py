@@ -0,0 +1,238 @@
+import math
+import tkinter as tk
+from threading import Thread, Lock
+from tkinter import messagebox
+
+import numpy as np
+
+from .device import DeviceSettingsFrame
+from .preview import PreviewRenderer
+from video import VideoStream, VideoProcessStream, VideoDeviceSettings, \
+    FrameError
+
+
+class GridViewFrame(tk.Frame):
+
+    UPDATE_DELAY = 50
+    CANVAS_SIZE = (960, 720)
+    RESOLUTION = (640, 480)
+    PROCESS_CAPTURE = True
+
+    def __init__(self, paths, master=None, processes=PROCESS_CAPTURE):
+        super().__init__(master)
+        self.paths = list(paths)
+        self.processes = processes
+        self.streams = [None] * len(self.paths)
+        self.settings = [None] * len(self.paths)
+        self.errors = [None] * len(self.paths)
+        self.tile_errors = [None] * len(self.paths)
+        self.seqs = [0] * len(self.paths)
+        self.settings_frames = {}
+        self.composite = None
+        self.closed = False
+        self.close_lock = Lock()
+
+        self.create_widgets()
+
+        # Every camera gets its own capture thread, or process so that the
+        # decoding is not serialized by the GIL. They are opened in parallel:
+        for i, path in enumerate(self.paths):
+            Thread(target=self.open_stream, args=(i, path),
+                   daemon=True).start()
+
+        self.bind('<Destroy>', lambda _: self.close())
+        self.update_canvas()
+
+    def create_widgets(self):
+        w, h = self.CANVAS_SIZE
+        self.canvas = tk.Canvas(self, width=w, height=h, bg='gray')
+        self.canvas.pack(fill='both', expand=True, padx=5, pady=5)
+        self.canvas.bind('<Button-1>', self.open_settings)
+        self.pack(fill='both', expand=True)
+
+        # All the tiles are composited into one image, so there is a single
+        # PhotoImage update per tick however many cameras there are:
+        self.renderer = PreviewRenderer(self.canvas, 0)
+        self.labels = [
+            self.canvas.create_text(0, 0, fill='yellow', anchor='nw',
+                                    font=PreviewRenderer.FONT)
+            for _ in self.paths]
+
+    def open_stream(self, i, path):
+
+        cls = VideoProcessStream if self.processes else VideoStream
+
+        try:
+            stream = cls.open(path, self.RESOLUTION, raw=True)
+        except Exception as e:
+            self.errors[i] = str(e)
+            return
+
+        try:
+            settings = VideoDeviceSettings(path) if stream.is_device else None
+        except Exception as e:
+            stream.release()
+            self.errors[i] = str(e)
+            return
+
+        # The grid may be closed while the stream opens. Either close() sees
+        # the stream here or it is released right away:
+        with self.close_lock:
+
+            if not self.closed:
+                self.settings[i] = settings
+                self.streams[i] = stream
+                return
+
+        stream.release()
+
+        if settings is not None:
+            settings.close()
+
+    def layout(self):
+        cols = math.ceil(math.sqrt(len(self.paths)))
+        rows = math.ceil(len(self.paths) / cols)
+
+        w = max(self.canvas.winfo_width(), cols)
+        h = max(self.canvas.winfo_height(), rows)
+
+        return cols, (w // cols, h // rows)
+
+    def update_canvas(self):
+
+        if self.closed:
+            return
+
+        # A failure in here must not stop the updates for good:
+        try:
+            self.update_tiles()
+        finally:
+            self.after(self.UPDATE_DELAY, self.update_canvas)
+
+    def update_tiles(self):
+        cols, (tile_w, tile_h) = self.layout()
+        shape = (tile_h * math.ceil(len(self.paths) / cols), tile_w * cols, 3)
+
+        if self.composite is None or self.composite.shape != shape:
+            self.composite = np.zeros(shape, dtype=np.uint8)
+            self.seqs = [0] * len(self.paths)
+
+        changed = False
+
+        for i, stream in enumerate(self.streams):
+            x = (i % cols) * tile_w
+            y = (i // cols) * tile_h
+
+            self.canvas.coords(self.labels[i], x + 5, y + 5)
+            self.canvas.itemconfig(self.labels[i], text=self.tile_label(i))
+
+            if stream is None:
+                continue
+
+            # One camera failing leaves the other tiles running, its label
+            # shows the error until a frame goes through again:
+            try:
+                changed |= self.update_tile(i, stream, x, y, tile_w, tile_h)
+                self.tile_errors[i] = None
+            except Exception as e:
+                self.tile_errors[i] = str(e)
+
+        if changed:
+            self.renderer.draw_frame(self.composite)
+
+    def update_tile(self, i, stream, x, y, tile_w, tile_h):
+        frame = stream.latest()
+
+        if frame is None or frame.seq == self.seqs[i]:
+            return False
+
+        # MJPEG frames get decoded directly at (about) the tile size. A
+        # corrupt one leaves the previous tile in place:
+        try:
+            tile = frame.resize((tile_w, tile_h)).rgb()
+        except FrameError:
+            self.seqs[i] = frame.seq
+            return False
+
+        # Frames from a capture process are views into its ring, which may
+        # have been overwritten while the tile was made from it. Then the
+        # next tick tries again with a newer frame:
+        if not stream.is_valid(frame):
+            return False
+
+        self.seqs[i] = frame.seq
+        self.composite[y:y + tile_h, x:x + tile_w] = tile
+
+        return True
+
+    def tile_label(self, i):
+        path = self.paths[i]
+        stream = self.streams[i]
+
+        if self.errors[i] is not None:
+            return '{p}  {e}'.format(p=path, e=self.errors[i])
+
+        if self.tile_errors[i] is not None:
+            return '{p}  {e}'.format(p=path, e=self.tile_errors[i])
+
+        if stream is None:
+            return '{p}  opening...'.format(p=path)
+
+        fps = stream.capture_rate() or 0
+        label = '{p}  {f:.1f} fps  {d} dropped'.format(
+            p=path, f=fps, d=stream.dropped + stream.discarded)
+
+        if getattr(stream, 'restarts', 0):
+            label += '  {r} restarts'.format(r=stream.restarts)
+
+        return label
+
+    def open_settings(self, event):
+        cols, (tile_w, tile_h) = self.layout()
+        i = (event.y // tile_h) * cols + event.x // tile_w
+
+        if i >= len(self.paths) or self.settings[i] is None:
+            return
+
+        frame = self.settings_frames.get(i)
+
+        if frame is not None:
+            frame.focus()
+            return
+
+        frame = tk.Toplevel(self)
+        frame.title('Video Device Settings: {p}'.format(p=self.paths[i]))
+        frame.protocol('WM_DELETE_WINDOW',
+                       lambda: self.close_settings(i))
+        self.settings_frames[i] = frame
+
+        try:
+            DeviceSettingsFrame(self.settings[i], frame)
+        except Exception as e:
+            self.close_settings(i)
+            messagebox.showerror('Error', str(e))
+
+    def close_settings(self, i):
+        frame = self.settings_frames.pop(i, None)
+
+        if frame is not None:
+            frame.destroy()
+
+    def close(self):
+
+        with self.close_lock:
+
+            if self.closed:
+                return
+
+            self.closed = True
+
+        for stream in self.streams:
+
+            if stream is not None:
+                Thread(target=stream.release, daemon=True).start()
+
+        for settings in self.settings:
+
+            if settings is not None:
+                settings.close()
@@ -0,0 +1,94 @@
+class PreviewRenderer(object):
+
+    FONT = 'Helvetica 10'
+    STATS_FONT = 'Courier 9'
+    LABEL_ANCHOR = (15, 15)
+    STATS_ANCHOR = (15, 30)
+
+    def __init__(self, canvas, max_roi):
+        self.canvas = canvas
+        self.photo = None
+
+        # All the canvas items are created once and then only updated in
+        # place, so the item list never grows while the preview is running:
+        self.image_item = canvas.create_image(0, 0, anchor='nw')
+
+        x, y = self.LABEL_ANCHOR
+        self.label_item = canvas.create_text(
+            x, y, fill='yellow', font=self.FONT, anchor='w',
+            state='hidden')
+
+        self.roi_items = []
+
+        for _ in range(max_roi):
+            box = canvas.create_rectangle(
+                0, 0, 0, 0, width=2, state='hidden')
+            text = canvas.create_text(
+                0, 0, font=self.FONT, anchor='w', state='hidden')
+            self.roi_items.append((box, text))
+
+        self.roi_tmp_item = canvas.create_rectangle(
+            0, 0, 0, 0, outline='blue', width=2, state='hidden')
+
+        x, y = self.STATS_ANCHOR
+        self.stats_item = canvas.create_text(
+            x, y, fill='yellow', font=self.STATS_FONT, anchor='nw',
+            state='hidden')
+
+    def draw_frame(self, frame):
+        # PIL is loaded with the first frame, not when the window is created:
+        from PIL import Image, ImageTk
+
+        img = Image.fromarray(frame)
+
+        if self.photo is None or \
+                (self.photo.width(), self.photo.height()) != img.size:
+            self.photo = ImageTk.PhotoImage(img)
+            self.canvas.itemconfig(self.image_item, image=self.photo,
+                                   state='normal')
+        else:
+            self.photo.paste(img)
+
+    def draw_label(self, text):
+        self.canvas.itemconfig(self.label_item, text=text, state='normal')
+
+    def draw_roi(self, i, box, color, dash=''):
+        box_item, text_item = self.roi_items[i]
+
+        self.canvas.coords(box_item, *box)
+        self.canvas.itemconfig(box_item, outline=color, dash=dash,
+                               state='normal')
+
+        self.canvas.coords(text_item, box[0], box[1] - 10)
+        self.canvas.itemconfig(text_item, fill=color, state='normal',
+                               text='ROI {i}'.format(i=i + 1))
+
+    def hide_roi(self, i):
+
+        for item in self.roi_items[i]:
+            self.canvas.itemconfig(item, state='hidden')
+
+    def draw_roi_tmp(self, box):
+
+        if box is None:
+            self.canvas.itemconfig(self.roi_tmp_item, state='hidden')
+        else:
+            self.canvas.coords(self.roi_tmp_item, *box)
+            self.canvas.itemconfig(self.roi_tmp_item, state='normal')
+
+    def draw_stats(self, text):
+
+        if text is None:
+            self.canvas.itemconfig(self.stats_item, state='hidden')
+        else:
+            self.canvas.itemconfig(self.stats_item, text=text, state='normal')
+
+    def clear(self):
+        self.photo = None
+        self.canvas.itemconfig(self.image_item, image='', state='hidden')
+        self.canvas.itemconfig(self.label_item, state='hidden')
+        self.draw_roi_tmp(None)
+        self.draw_stats(None)
+
+        for i in range(len(self.roi_items)):
+            self.hide_roi(i)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Compares the old RGB-everywhere frame path with the format-aware one on
+# synthetic frames. For the preview (capture, resize to canvas, convert for
+# PhotoImage) and the snapshot (encode to JPEG) paths it reports time and
+# peak temporary allocations per frame:
+#
+#   $ python3 -m bench.frame --width 1920 --height 1080
+#
+import time
+import argparse
+import tracemalloc
+
+import cv2
+
+from video import VideoFrame
+from bench.sources import SyntheticSource
+
+
+def legacy_preview(frame, size):
+    # The capture thread converted every full-size frame to RGB, and the
+    # preview resized it afterwards:
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    return cv2.resize(rgb, size)
+
+
+def preview(frame, size):
+    return VideoFrame(frame).resize(size).rgb()
+
+
+def legacy_snapshot(frame):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+    return cv2.imencode('.jpg', bgr)[1]
+
+
+def snapshot(frame):
+    return cv2.imencode('.jpg', VideoFrame(frame).bgr())[1]
+
+
+def measure(func, frames, *args):
+    func(frames[0], *args)
+
+    t_start = time.perf_counter()
+
+    for frame in frames:
+        func(frame, *args)
+
+    t_elapsed = (time.perf_counter() - t_start) / len(frames)
+
+    tracemalloc.start()
+    func(frames[0], *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return 1000 * t_elapsed, peak / 2 ** 20
+
+
+def mjpeg_preview(data, size):
+    return VideoFrame(data, 'mjpeg').resize(size).rgb()
+
+
+def results(size, canvas_size, count):
+    source = SyntheticSource(size)
+    frames = list(source.frames(count))
+    jpegs = source.jpeg()
+    results = {}
+
+    for name, func, inputs, args in [
+            ('legacy preview', legacy_preview, frames, (canvas_size,)),
+            ('preview', preview, frames, (canvas_size,)),
+            ('mjpeg preview', mjpeg_preview, jpegs, (canvas_size,)),
+            ('legacy snapshot', legacy_snapshot, frames, ()),
+            ('snapshot', snapshot, frames, ())]:
+        t_frame, peak = measure(func, inputs, *args)
+        results[name] = {'ms': round(t_frame, 3), 'peak_mib': round(peak, 2)}
+
+    return results
+
+
+def run(size, canvas_size, count):
+    print('{:<18} {:>10} {:>12}'.format('path', 'ms/frame', 'peak, MiB'))
+
+    for name, entry in results(size, canvas_size, count).items():
+        print('{:<18} {:>10.3f} {:>12.2f}'.format(
+            name, entry['ms'], entry['peak_mib']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame pipeline benchmark.')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--canvas-width', type=int, default=640)
+    parser.add_argument('--canvas-height', type=int, default=480)
+    parser.add_argument('--frames', type=int, default=50)
+    args = parser.parse_args()
+
+    run((args.width, args.height), (args.canvas_width, args.canvas_height),
+        args.frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Long-running preview benchmark. It feeds synthetic frames through the
+# preview renderer and reports redraw time, canvas item count and resident
+# memory per window of frames. All of them should stay flat over time:
+#
+#   $ python3 -m bench.preview --frames 20000 --window 1000
+#
+import time
+import argparse
+import tkinter as tk
+
+from video import VideoFrame
+from app.preview import PreviewRenderer
+from bench.sources import SyntheticSource
+
+
+def rss_kb():
+
+    with open('/proc/self/status') as f:
+
+        for line in f:
+
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+
+def windows(frames, window, size, num_roi, source_size=None, fps=None):
+    # Yields the redraw time, canvas item count and RSS for every window of
+    # frames. Frames come from a synthetic source, at the canvas size unless
+    # given otherwise, and go through the same resize and conversion as in
+    # the application:
+    root = tk.Tk()
+    w, h = size
+    canvas = tk.Canvas(root, width=w, height=h)
+    canvas.pack()
+    renderer = PreviewRenderer(canvas, num_roi)
+
+    source = SyntheticSource(source_size or size, fps)
+    boxes = [[w * i / (2 * num_roi), h * 0.2,
+              w * (i + 1) / (2 * num_roi), h * 0.8] for i in range(num_roi)]
+
+    t_window = 0
+
+    try:
+
+        for n in range(1, frames + 1):
+            frame = VideoFrame(source.read())
+            t_start = time.perf_counter()
+
+            renderer.draw_frame(frame.resize(size).rgb())
+            renderer.draw_label('Res. {w}x{h}'.format(w=w, h=h))
+
+            for i, box in enumerate(boxes):
+                renderer.draw_roi(i, box, 'blue')
+
+            root.update()
+            t_window += time.perf_counter() - t_start
+
+            if n % window == 0:
+                yield {
+                    'frames': n,
+                    'redraw_ms': round(1000 * t_window / window, 3),
+                    'items': len(canvas.find_all()),
+                    'rss_kib': rss_kb(),
+                }
+                t_window = 0
+    finally:
+        root.destroy()
+
+
+def run(frames, window, size, num_roi):
+    print('{:>8} {:>12} {:>8} {:>10}'.format(
+        'frames', 'redraw, ms', 'items', 'rss, KiB'))
+
+    for row in windows(frames, window, size, num_roi):
+        print('{:>8} {:>12.3f} {:>8} {:>10}'.format(
+            row['frames'], row['redraw_ms'], row['items'], row['rss_kib']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preview redraw benchmark.')
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--window', type=int, default=500)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--roi', type=int, default=10)
+    args = parser.parse_args()
+
+    run(args.frames, args.window, (args.width, args.height), args.roi)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# Synthetic inputs for the benchmarks: generated video files, a NumPy frame
+# source and the stand-in v4l2-ctl in bench/bin.
+import os
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+BIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+
+
+class SyntheticSource(object):
+
+    POOL_SIZE = 8
+
+    def __init__(self, size=(640, 480), fps=None, seed=0):
+        self.size = size
+        self.fps = fps
+
+        # A handful of noise frames, which is the worst case for JPEG and
+        # rules out any caching of identical frames:
+        w, h = size
+        rng = np.random.default_rng(seed)
+        self.pool = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+                     for _ in range(self.POOL_SIZE)]
+        self.seq = 0
+        self.t_next = None
+
+    def read(self):
+
+        # Paced like a camera if there is a frame rate, otherwise as fast as
+        # the consumer asks:
+        if self.fps:
+            t_now = time.perf_counter()
+
+            if self.t_next is None:
+                self.t_next = t_now
+
+            if self.t_next > t_now:
+                time.sleep(self.t_next - t_now)
+
+            self.t_next = max(self.t_next + 1 / self.fps,
+                              time.perf_counter() - 1 / self.fps)
+
+        frame = self.pool[self.seq % len(self.pool)]
+        self.seq += 1
+
+        return frame
+
+    def frames(self, count):
+
+        for _ in range(count):
+            yield self.read()
+
+    def jpeg(self, quality=90):
+        return [cv2.imencode('.jpg', f, [cv2.IMWRITE_JPEG_QUALITY, quality])[1]
+                for f in self.pool]
+
+
+def make_video(filename, size=(640, 480), fps=30, frames=300,
+               fourcc='MJPG'):
+    w, h = size
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), fps,
+                             (w, h))
+
+    if not writer.isOpened():
+        raise IOError('Failed to create {f}'.format(f=filename))
+
+    # A moving gradient with some noise compresses like a camera image:
+    x = np.linspace(0, 255, w, dtype=np.float32)
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+
+    for n in range(frames):
+        base = (x + y + 4 * n) % 256
+        noise = rng.normal(0, 8, (h, w)).astype(np.float32)
+        gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+        writer.write(cv2.merge([gray, 255 - gray, gray // 2]))
+
+    writer.release()
+
+    return filename
+
+
+@contextmanager
+def fake_v4l2_ctl(delay=0, log=None):
+    # Puts the stand-in v4l2-ctl first on the PATH for the duration:
+    saved = {k: os.environ.get(k)
+             for k in ('PATH', 'FAKE_V4L2_DELAY', 'FAKE_V4L2_LOG')}
+
+    os.environ['PATH'] = BIN_DIR + os.pathsep + os.environ.get('PATH', '')
+    os.environ['FAKE_V4L2_DELAY'] = str(delay)
+
+    if log is not None:
+        os.environ['FAKE_V4L2_LOG'] = log
+
+    try:
+        yield
+    finally:
+
+        for key, val in saved.items():
+
+            if val is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = val
+
+
+def count_calls(log):
+
+    try:
+
+        with open(log, 'r') as f:
+            return sum(1 for _ in f)
+
+    except OSError:
+        return 0
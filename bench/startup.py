@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Startup time check. Imports the packages in fresh interpreters with
+# -X importtime, checks the cumulative import times against their budgets and
+# that none of the heavy modules is loaded before it is needed. With a
+# display, it also measures how long the main window takes to appear:
+#
+#   $ python3 -m bench.startup
+#   $ python3 -m bench.startup --repeat 10 --output startup.json
+#
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Cumulative import times in milliseconds:
+BUDGETS = {
+    'video': 30,
+    'app.camerado': 100,
+}
+
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WINDOW_SCRIPT = '''
+import time
+t_start = time.perf_counter()
+from app import CameradoApplication
+app = CameradoApplication()
+app.wait_visibility()
+print(time.perf_counter() - t_start)
+app.destroy()
+'''
+
+
+def import_time(module):
+    code = 'import sys, {m}; print(",".join(m for m in {h!r} ' \
+        'if m in sys.modules))'.format(m=module, h=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT_DIR, capture_output=True, text=True,
+                          check=True)
+
+    # Lines look like "import time:  self [us] | cumulative | name", the
+    # module imported last is the requested one:
+    cumulative = None
+
+    for line in proc.stderr.splitlines():
+
+        if not line.startswith('import time:'):
+            continue
+
+        toks = [t.strip() for t in line[len('import time:'):].split('|')]
+
+        if toks[2] == module:
+            cumulative = int(toks[1]) / 1000
+
+    heavy = [m for m in proc.stdout.strip().split(',') if m]
+
+    return cumulative, heavy
+
+
+def window_time():
+
+    if not os.environ.get('DISPLAY'):
+        return
+
+    proc = subprocess.run([sys.executable, '-c', WINDOW_SCRIPT],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+
+    if proc.returncode != 0:
+        return
+
+    return round(1000 * float(proc.stdout.strip().splitlines()[-1]), 3)
+
+
+def results(repeat=5, budgets=BUDGETS):
+    results = {'imports': {}, 'ok': True}
+
+    for module, budget in budgets.items():
+        samples = []
+        heavy = []
+
+        # The fastest run is the least disturbed by the rest of the system:
+        for _ in range(repeat):
+            t, heavy = import_time(module)
+            samples.append(t)
+
+        entry = {
+            'ms': round(min(samples), 3),
+            'budget_ms': budget,
+            'heavy_modules': heavy,
+        }
+        entry['ok'] = entry['ms'] <= budget and not heavy
+        results['imports'][module] = entry
+        results['ok'] = results['ok'] and entry['ok']
+
+    t_window = window_time()
+
+    if t_window is not None:
+        results['window_ms'] = t_window
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time check.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to a JSON file')
+    args = parser.parse_args()
+
+    report = results(args.repeat)
+
+    print(json.dumps(report, indent=2))
+
+    if args.output is not None:
+
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not report['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# Benchmark suite of Camerado's hot paths, runnable without a camera. Video
+# files are generated, frames come from a synthetic NumPy source and the
+# v4l2-ctl backend talks to the stand-in in bench/bin. Results are written as
+# JSON; comparing them against a baseline flags the regressions:
+#
+#   $ python3 -m bench.suite --output before.json
+#   $ python3 -m bench.suite --output after.json --baseline before.json
+#   $ python3 -m bench.suite --only frame controls --width 1920 --height 1080
+#
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+
+from video import VideoStream, VideoFileStream, VideoFileIndex, \
+    VideoDeviceSettings, V4L2CtlBackend
+from bench import frame as frame_bench
+from bench import preview as preview_bench
+from bench import startup as startup_bench
+from bench.sources import make_video, fake_v4l2_ctl, count_calls
+
+
+def timed(func, repeat):
+    # Per-call times in milliseconds, after one warm-up call:
+    func()
+    samples = []
+
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        func()
+        samples.append(1000 * (time.perf_counter() - t_start))
+
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+
+    if not samples:
+        return {}
+
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 4),
+        'p50_ms': round(samples[len(samples) // 2], 4),
+        'p95_ms': round(samples[min(len(samples) - 1,
+                                    len(samples) * 95 // 100)], 4),
+    }
+
+
+def bench_stream(args, tmp_dir):
+    filename = make_video(os.path.join(tmp_dir, 'bench.avi'), args.size,
+                          frames=args.frames)
+    results = {}
+
+    stream = VideoStream(filename, args.size)
+    samples = []
+
+    while True:
+        t_start = time.perf_counter()
+        frame = stream.read(drain=False)
+
+        if frame is None:
+            break
+
+        samples.append(1000 * (time.perf_counter() - t_start))
+
+    stream.release()
+    results['read'] = summarize(samples)
+
+    # The same split the capture thread measures, grab and retrieve:
+    stream = VideoStream(filename, args.size)
+    grabs, retrieves = [], []
+
+    while True:
+        t_start = time.perf_counter()
+
+        if not stream.grab():
+            break
+
+        t_grab = time.perf_counter()
+        stream.retrieve()
+        grabs.append(1000 * (t_grab - t_start))
+        retrieves.append(1000 * (time.perf_counter() - t_grab))
+
+    stream.release()
+    results['grab'] = summarize(grabs)
+    results['retrieve'] = summarize(retrieves)
+
+    return results
+
+
+def bench_seek(args, tmp_dir):
+    # MPEG-4 with a keyframe every 12 frames, so seeks have to decode:
+    filename = make_video(os.path.join(tmp_dir, 'seek.mp4'), args.size,
+                          frames=args.frames, fourcc='mp4v')
+    rng = random.Random(0)
+    targets = [rng.randrange(args.frames) for _ in range(args.frames // 2)]
+    results = {}
+
+    t_start = time.perf_counter()
+    VideoFileIndex.build(filename).save(filename)
+    results['index_build_ms'] = round(
+        1000 * (time.perf_counter() - t_start), 3)
+    results['index_load'] = timed(lambda: VideoFileIndex.load(filename),
+                                  args.repeat // 10)
+
+    def seeks(stream, frames):
+        samples = []
+
+        for n in frames:
+            t_start = time.perf_counter()
+            stream.get(n)
+            samples.append(1000 * (time.perf_counter() - t_start))
+
+        return summarize(samples)
+
+    # Without a cache every seek decodes, with one the second pass over the
+    # same frames does not:
+    stream = VideoFileStream(filename, args.size, cache_bytes=0)
+    results['random'] = seeks(stream, targets)
+    stream.release()
+
+    stream = VideoFileStream(filename, args.size)
+    seeks(stream, targets)
+    results['random_cached'] = seeks(stream, targets)
+    stream.release()
+
+    stream = VideoFileStream(filename, args.size)
+    results['step_back'] = seeks(stream, range(args.frames - 1, -1, -1))
+    stream.release()
+
+    return results
+
+
+def bench_frame(args, tmp_dir):
+    return frame_bench.results(args.size, args.canvas_size, args.frames)
+
+
+def bench_controls(args, tmp_dir):
+    log = os.path.join(tmp_dir, 'v4l2-ctl.log')
+
+    with fake_v4l2_ctl(log=log):
+        backend = V4L2CtlBackend(args.device)
+        set_str = backend._exec_shell(['v4l2-ctl', '-d', args.device, '-L'])
+
+        return {
+            'parse': timed(lambda: backend._str_to_list(set_str),
+                           args.repeat),
+            'get_controls': timed(backend.get_controls, args.repeat // 10),
+            'get_resolutions': timed(backend.get_resolutions,
+                                     args.repeat // 10),
+        }
+
+
+def bench_set(args, tmp_dir):
+    results = {}
+
+    for name, batched in (('batched', True), ('per_control', False)):
+        log = os.path.join(tmp_dir, 'set-{n}.log'.format(n=name))
+
+        with fake_v4l2_ctl(delay=args.v4l2_delay, log=log):
+            settings = VideoDeviceSettings(
+                args.device, backend=V4L2CtlBackend(args.device))
+
+            # Every int control moves away from its current value, so none of
+            # them is skipped as unchanged:
+            changes = []
+
+            for entry in settings.get():
+
+                if entry['type'] != 'int' or settings.is_inactive(entry):
+                    continue
+
+                value = entry['min'] if entry['value'] != entry['min'] else \
+                    entry['max']
+                changes.append({'name': entry['name'], 'value': value})
+
+            calls = count_calls(log)
+            t_start = time.perf_counter()
+
+            if batched:
+                settings.set(changes)
+            else:
+
+                for change in changes:
+                    settings.set([change])
+
+            results[name] = {
+                'controls': len(changes),
+                'ms': round(1000 * (time.perf_counter() - t_start), 3),
+                'calls': count_calls(log) - calls,
+            }
+
+    return results
+
+
+def bench_preview(args, tmp_dir):
+
+    try:
+        rows = list(preview_bench.windows(
+            args.frames, max(args.frames // 4, 1), args.canvas_size,
+            args.roi, source_size=args.size))
+    except Exception as e:
+        # Tk needs a display:
+        return {'skipped': str(e)}
+
+    return {
+        'redraw_ms': rows[-1]['redraw_ms'],
+        'items': rows[-1]['items'],
+        'rss_growth_kib': rows[-1]['rss_kib'] - rows[0]['rss_kib'],
+        'windows': rows,
+    }
+
+
+def bench_startup(args, tmp_dir):
+    return startup_bench.results()
+
+
+BENCHMARKS = {
+    'stream': bench_stream,
+    'seek': bench_seek,
+    'frame': bench_frame,
+    'controls': bench_controls,
+    'set': bench_set,
+    'preview': bench_preview,
+    'startup': bench_startup,
+}
+
+
+def metadata():
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def flatten(results, prefix=''):
+
+    for key, val in results.items():
+        name = prefix + key
+
+        if isinstance(val, dict):
+            yield from flatten(val, name + '.')
+        elif isinstance(val, (int, float)):
+            yield name, val
+
+
+def compare(results, baseline, tolerance):
+    # Only times are compared, every key ending in "ms" is lower-is-better:
+    old = dict(flatten(baseline['results']))
+    regressions = []
+
+    for name, val in flatten(results['results']):
+
+        if not name.endswith('ms') or not old.get(name):
+            continue
+
+        ratio = val / old[name]
+
+        if ratio > 1 + tolerance:
+            regressions.append({
+                'metric': name,
+                'baseline': old[name],
+                'current': val,
+                'ratio': round(ratio, 3),
+            })
+
+    return regressions
+
+
+def run(args):
+    results = {
+        'meta': metadata(),
+        'args': {
+            'size': list(args.size),
+            'canvas_size': list(args.canvas_size),
+            'frames': args.frames,
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='camerado-bench-') as tmp_dir:
+
+        for name in args.only or BENCHMARKS:
+            print('Running {n}...'.format(n=name), file=sys.stderr)
+            results['results'][name] = BENCHMARKS[name](args, tmp_dir)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camerado benchmark suite.')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS),
+                        help='run these benchmarks only')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--canvas-width', type=int, default=640)
+    parser.add_argument('--canvas-height', type=int, default=480)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--roi', type=int, default=10)
+    parser.add_argument('--device', default='/dev/video0',
+                        help='device name passed to the fake v4l2-ctl')
+    parser.add_argument('--v4l2-delay', type=float, default=0.005,
+                        help='seconds every fake v4l2-ctl call takes')
+    parser.add_argument('--output', help='write the results to a JSON file')
+    parser.add_argument('--baseline', help='results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown over the baseline to report')
+    args = parser.parse_args()
+
+    args.size = (args.width, args.height)
+    args.canvas_size = (args.canvas_width, args.canvas_height)
+
+    results = run(args)
+
+    if args.baseline is not None:
+
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        results['regressions'] = compare(results, baseline, args.tolerance)
+
+    print(json.dumps(results, indent=2))
+
+    if args.output is not None:
+
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,203 @@
 #!/usr/bin/env python3
 import sys
+import json
+import argparse
 
-from app import CameradoApplication
 
+def parse_size(size):
+    w, h = size.lower().split('x')
+
+    return (int(w), int(h))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Play around with V4L video camera settings.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    capture = subparsers.add_parser(
+        'capture', help='capture without GUI and report throughput')
+    capture.add_argument('path', nargs='?', default=None,
+                         help='video device or file (default: from profile)')
+    capture.add_argument('-p', '--profile',
+                         help='settings profile saved from the GUI')
+    capture.add_argument('-s', '--size', type=parse_size, default=None,
+                         help='resolution, e.g. 1600x1200')
+    capture.add_argument('-n', '--frames', type=int, default=None,
+                         help='stop after this many frames')
+    capture.add_argument('-t', '--duration', type=float, default=None,
+                         help='stop after this many seconds')
+    capture.add_argument('-r', '--roi-stats', action='store_true',
+                         help='compute per-ROI statistics of the profile')
+    capture.add_argument('-d', '--dump-dir', default=None,
+                         help='save frames (or ROI crops) to this directory')
+    capture.add_argument('--dump-every', type=int, default=1,
+                         help='save every n-th frame only')
+    capture.add_argument('--record', default=None,
+                         help='record to a video file (.mjpg: raw MJPEG)')
+    capture.add_argument('--drop-policy', default='drop-oldest',
+                         choices=['drop-oldest', 'drop-newest'],
+                         help='what to drop when the recorder falls behind')
+    capture.add_argument('-m', '--motion-threshold', type=float,
+                         default=None,
+                         help='skip ROI statistics and dumps of frames '
+                              'which changed less than this (gray levels)')
+    capture.add_argument('-o', '--output', default=None,
+                         help='write the report to a JSON file')
+
+    apply = subparsers.add_parser(
+        'apply', help='apply settings profiles to many devices at once')
+    apply.add_argument('paths', nargs='*',
+                       help='video devices (default: from profile)')
+    apply.add_argument('-p', '--profile',
+                       help='settings profile to apply to all devices')
+    apply.add_argument('-m', '--mapping',
+                       help='JSON file mapping devices to profiles')
+    apply.add_argument('-w', '--workers', type=int, default=None,
+                       help='number of devices configured in parallel')
+    apply.add_argument('-o', '--output', default=None,
+                       help='write the report to a JSON file')
+
+    serve = subparsers.add_parser(
+        'serve', help='serve the stream as MJPEG over HTTP')
+    serve.add_argument('path', nargs='?', default='/dev/video0',
+                       help='video device or file')
+    serve.add_argument('-p', '--profile',
+                       help='settings profile to apply first')
+    serve.add_argument('-s', '--size', type=parse_size, default=None,
+                       help='resolution, e.g. 1600x1200')
+    serve.add_argument('--host', default='127.0.0.1',
+                       help='address to listen on')
+    serve.add_argument('--port', type=int, default=8080,
+                       help='port to listen on')
+    serve.add_argument('-q', '--quality', type=int, default=85,
+                       help='JPEG quality for frames which are not MJPEG')
+
+    return parser.parse_args(argv)
+
+
+def capture(args):
+    from video.headless import HeadlessCapture
+
+    kwargs = {
+        'roi_stats': args.roi_stats,
+        'dump_dir': args.dump_dir,
+        'dump_every': args.dump_every,
+        'record': args.record,
+        'drop_policy': args.drop_policy,
+        'motion_threshold': args.motion_threshold,
+    }
+
+    if args.profile is not None:
+        cap = HeadlessCapture.from_profile(args.profile, args.path, **kwargs)
+    else:
+        cap = HeadlessCapture(args.path or '/dev/video0', **kwargs)
+
+    if args.size is not None:
+        cap.size = args.size
+
+    report = cap.run(frames=args.frames, duration=args.duration)
+
+    print(json.dumps(report, indent=2))
+
+    if args.output is not None:
+
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def apply(args):
+    from video.bulk import VideoSettingsBulkApply
+
+    profiles = {}
+
+    if args.profile is not None:
+
+        with open(args.profile, 'r') as f:
+            cfg = json.load(f)
+
+        for path in args.paths or [cfg['path']]:
+            profiles[path] = cfg['settings'] or []
+
+    if args.mapping is not None:
+
+        with open(args.mapping, 'r') as f:
+            mapping = json.load(f)
+
+        for path, filename in mapping.items():
+            profiles[path] = VideoSettingsBulkApply.load_profile(filename)
+
+    if not profiles:
+        raise ValueError('Either a profile or a mapping is required.')
+
+    bulk = VideoSettingsBulkApply(workers=args.workers)
+    report = bulk.apply(profiles)
+
+    print(json.dumps(report, indent=2))
+
+    if args.output is not None:
+
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not all(r['ok'] for r in report):
+        sys.exit(1)
+
+
+def serve(args):
+    from video import VideoStream, VideoDeviceSettings, VideoStreamServer
+
+    size = args.size or (640, 480)
+    settings = None
+
+    if args.profile is not None:
+
+        with open(args.profile, 'r') as f:
+            cfg = json.load(f)
+
+        size = args.size or tuple(cfg['resolution'])
+
+    if args.path.startswith('/dev/'):
+        settings = VideoDeviceSettings(args.path)
+
+        if args.profile is not None and cfg['settings']:
+            settings.set(cfg['settings'])
+
+    # Raw mode, so that MJPEG frames go out without being decoded:
+    stream = VideoStream.open(args.path, size, raw=True)
+    server = VideoStreamServer(stream, settings, args.host, args.port,
+                               args.quality)
+
+    host, port = server.address
+    print('Serving {p} on http://{h}:{o}/'.format(p=args.path, h=host,
+                                                  o=port))
+
+    try:
+        server.serve_forever()
+    finally:
+        stream.release()
+
+        if settings is not None:
+            settings.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'capture':
+        capture(args)
+        return
+
+    if args.command == 'apply':
+        apply(args)
+        return
+
+    if args.command == 'serve':
+        serve(args)
+        return
+
+    from app import CameradoApplication
 
-def main():
     app = CameradoApplication()
     app.mainloop()
 
@@ -18,4 +211,3 @@ if __name__ == '__main__':
     except Exception as e:
         print('Unexpected error:', e, file=sys.stderr)
         sys.exit(1)
-
@@ -1,4 +1,47 @@
-from .stream import VideoStream
-from .counter import VideoFrameCounter
-from .settings import VideoDeviceSettings
+import importlib
 
+# The classes are imported on first access, so that e.g. the settings can be
+# used without loading OpenCV and NumPy:
+_EXPORTS = {
+    'VideoROI': 'roi',
+    'VideoFrame': 'frame',
+    'VideoStream': 'stream',
+    'VideoFrameRing': 'process',
+    'VideoProcessStream': 'process',
+    'VideoFrameCounter': 'counter',
+    'VideoDeviceSettings': 'settings',
+    'VideoDeviceDiscovery': 'discovery',
+    'IoctlBackend': 'backends',
+    'V4L2CtlBackend': 'backends',
+    'FakeBackend': 'backends',
+    'VideoSettingsWriter': 'writer',
+    'VideoSettingsBulkApply': 'bulk',
+    'VideoRecorder': 'recorder',
+    'VideoFrameBuffer': 'buffer',
+    'VideoStreamServer': 'server',
+    'VideoMotionDetector': 'motion',
+    'VideoFileIndex': 'playback',
+    'VideoFrameCache': 'playback',
+    'VideoFileStream': 'playback',
+    'SettingsError': 'exceptions',
+    'FrameError': 'exceptions',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+
+    if name not in _EXPORTS:
+        raise AttributeError('module {m!r} has no attribute {n!r}'.format(
+            m=__name__, n=name))
+
+    module = importlib.import_module('.' + _EXPORTS[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,569 @@
+import os
+import re
+import copy
+import errno
+import fcntl
+import ctypes
+from subprocess import Popen, TimeoutExpired, PIPE
+
+from .exceptions import SettingsError
+
+
+class ControlBackend(object):
+
+    def get_info(self):
+        raise NotImplementedError
+
+    def get_controls(self):
+        raise NotImplementedError
+
+    def get_resolutions(self):
+        raise NotImplementedError
+
+    def set_controls(self, settings):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def vals_to_str(settings):
+        toks = ['{n}={v}'.format(n=s['name'], v=s['value']) for s in settings]
+
+        return ','.join(toks)
+
+
+class V4L2CtlBackend(ControlBackend):
+
+    def __init__(self, dev='/dev/video0', timeout=None):
+        self.dev = dev
+        self.timeout = timeout
+
+    def get_info(self):
+        info_str = self._exec_shell(['v4l2-ctl', '-d', self.dev, '--info'])
+        fields = {}
+
+        # Newer versions also print a "Media Driver Info" section, only the
+        # first (video device) section is of interest:
+        for key, val in re.findall(r'^\s*(\w[\w ]*?)[ \t]*:[ \t]*(.+?)\s*$',
+                                   info_str, re.MULTILINE):
+            fields.setdefault(key, val)
+
+        return {
+            'driver': fields.get('Driver name', ''),
+            'card': fields.get('Card type', ''),
+            'bus_info': fields.get('Bus info', ''),
+            'capabilities': int(fields.get('Capabilities', '0'), 16),
+            'device_caps': int(fields.get('Device Caps', '0'), 16),
+        }
+
+    def get_controls(self):
+        set_str = self._exec_shell(['v4l2-ctl', '-d', self.dev, '-L'])
+
+        return self._str_to_list(set_str)
+
+    def get_resolutions(self):
+        formats = self._exec_shell(
+            ['v4l2-ctl', '-d', self.dev, '--list-formats-ext'])
+
+        str_list = re.findall(r'\s(\d+x\d+)', formats)
+        res_list = []
+
+        for s in set(str_list):
+            w, h = s.split('x')
+            res_list.append((int(w), int(h)))
+
+        return res_list
+
+    def set_controls(self, settings):
+        s_str = self.vals_to_str(settings)
+        self._exec_shell(['v4l2-ctl', '-d', self.dev, '--set-ctrl', s_str])
+
+    def _exec_shell(self, args):
+
+        proc = Popen(args, stdout=PIPE, stderr=PIPE)
+
+        try:
+            outs, errs = proc.communicate(timeout=self.timeout)
+        except TimeoutExpired:
+            proc.kill()
+            raise
+
+        if errs:
+            raise SettingsError(errs.decode('utf-8'))
+
+        return outs.decode('utf-8') or None
+
+    def _str_to_list(self, set_str):
+        set_list = []
+        lines = [i.strip() for i in set_str.strip().split('\n')]
+
+        for line in lines:
+            # Check if menu entry:
+            menu_entry = re.findall(r'^(\d+):\s(.+)$', line)
+
+            if menu_entry:
+                val, desc = menu_entry[0]
+
+                menu = set_list[-1].get('menu', {})
+                menu[int(val)] = desc
+
+                set_list[-1]['menu'] = menu
+            else:
+                # Find parameter name and type (int, bool, or menu):
+                name_type = re.findall(r'^(\w+)\s*.*\s\((\w+)\)', line)
+
+                if not name_type:
+                    continue
+
+                name, param_type = name_type[0]
+                param_entry = {
+                    'name': name,
+                    'type': param_type,
+                }
+                params = re.findall(r'(\w+)=(\S+)', line)
+
+                for name, val in params:
+
+                    try:
+                        param_entry[name] = int(val)
+                    except ValueError:
+                        param_entry[name] = val
+
+                set_list.append(param_entry)
+
+        return set_list
+
+
+def _ioc(direction, nr, size):
+    return (direction << 30) | (size << 16) | (ord('V') << 8) | nr
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ('driver', ctypes.c_char * 16),
+        ('card', ctypes.c_char * 32),
+        ('bus_info', ctypes.c_char * 32),
+        ('version', ctypes.c_uint32),
+        ('capabilities', ctypes.c_uint32),
+        ('device_caps', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_fmtdesc(ctypes.Structure):
+    _fields_ = [
+        ('index', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('description', ctypes.c_char * 32),
+        ('pixelformat', ctypes.c_uint32),
+        ('mbus_code', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_frmsize_discrete(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_stepwise(ctypes.Structure):
+    _fields_ = [
+        ('min_width', ctypes.c_uint32),
+        ('max_width', ctypes.c_uint32),
+        ('step_width', ctypes.c_uint32),
+        ('min_height', ctypes.c_uint32),
+        ('max_height', ctypes.c_uint32),
+        ('step_height', ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_union(ctypes.Union):
+    _fields_ = [
+        ('discrete', v4l2_frmsize_discrete),
+        ('stepwise', v4l2_frmsize_stepwise),
+    ]
+
+
+class v4l2_frmsizeenum(ctypes.Structure):
+    _fields_ = [
+        ('index', ctypes.c_uint32),
+        ('pixel_format', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('size', v4l2_frmsize_union),
+        ('reserved', ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_queryctrl(ctypes.Structure):
+    _fields_ = [
+        ('id', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('name', ctypes.c_char * 32),
+        ('minimum', ctypes.c_int32),
+        ('maximum', ctypes.c_int32),
+        ('step', ctypes.c_int32),
+        ('default_value', ctypes.c_int32),
+        ('flags', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_querymenu_union(ctypes.Union):
+    _fields_ = [
+        ('name', ctypes.c_char * 32),
+        ('value', ctypes.c_int64),
+    ]
+
+
+class v4l2_querymenu(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        ('id', ctypes.c_uint32),
+        ('index', ctypes.c_uint32),
+        ('menu', v4l2_querymenu_union),
+        ('reserved', ctypes.c_uint32),
+    ]
+
+
+class v4l2_ext_control_union(ctypes.Union):
+    _fields_ = [
+        ('value', ctypes.c_int32),
+        ('value64', ctypes.c_int64),
+        ('ptr', ctypes.c_void_p),
+    ]
+
+
+class v4l2_ext_control(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        ('id', ctypes.c_uint32),
+        ('size', ctypes.c_uint32),
+        ('reserved2', ctypes.c_uint32 * 1),
+        ('data', v4l2_ext_control_union),
+    ]
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [
+        ('which', ctypes.c_uint32),
+        ('count', ctypes.c_uint32),
+        ('error_idx', ctypes.c_uint32),
+        ('request_fd', ctypes.c_int32),
+        ('reserved', ctypes.c_uint32 * 1),
+        ('controls', ctypes.POINTER(v4l2_ext_control)),
+    ]
+
+
+class IoctlBackend(ControlBackend):
+
+    VIDIOC_QUERYCAP = _ioc(2, 0, ctypes.sizeof(v4l2_capability))
+    VIDIOC_ENUM_FMT = _ioc(3, 2, ctypes.sizeof(v4l2_fmtdesc))
+    VIDIOC_QUERYCTRL = _ioc(3, 36, ctypes.sizeof(v4l2_queryctrl))
+    VIDIOC_QUERYMENU = _ioc(3, 37, ctypes.sizeof(v4l2_querymenu))
+    VIDIOC_G_EXT_CTRLS = _ioc(3, 71, ctypes.sizeof(v4l2_ext_controls))
+    VIDIOC_S_EXT_CTRLS = _ioc(3, 72, ctypes.sizeof(v4l2_ext_controls))
+    VIDIOC_ENUM_FRAMESIZES = _ioc(3, 74, ctypes.sizeof(v4l2_frmsizeenum))
+
+    BUF_TYPE_VIDEO_CAPTURE = 1
+    FRMSIZE_TYPE_DISCRETE = 1
+    CTRL_WHICH_CUR_VAL = 0
+    CTRL_FLAG_NEXT_CTRL = 0x80000000
+
+    # Control types and flags as named by v4l2-ctl:
+    CTRL_TYPES = {
+        1: 'int',
+        2: 'bool',
+        3: 'menu',
+        9: 'intmenu',
+    }
+    CTRL_FLAGS = [
+        (0x0001, 'disabled'),
+        (0x0002, 'grabbed'),
+        (0x0004, 'read-only'),
+        (0x0008, 'update'),
+        (0x0010, 'inactive'),
+        (0x0020, 'slider'),
+        (0x0040, 'write-only'),
+        (0x0080, 'volatile'),
+    ]
+    CTRL_FLAG_DISABLED = 0x0001
+    CTRL_FLAG_WRITE_ONLY = 0x0040
+
+    def __init__(self, dev='/dev/video0'):
+        self.dev = dev
+        self.fd = os.open(dev, os.O_RDWR | os.O_NONBLOCK)
+        self.ctrl_ids = None
+
+        try:
+            self.info = self._ioctl(self.VIDIOC_QUERYCAP, v4l2_capability())
+        except OSError:
+            self.close()
+            raise
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        fd = getattr(self, 'fd', None)
+
+        if fd is not None:
+            os.close(fd)
+            self.fd = None
+
+    def get_info(self):
+        return {
+            'driver': self.info.driver.decode('utf-8', 'replace'),
+            'card': self.info.card.decode('utf-8', 'replace'),
+            'bus_info': self.info.bus_info.decode('utf-8', 'replace'),
+            'capabilities': self.info.capabilities,
+            'device_caps': self.info.device_caps,
+        }
+
+    def get_controls(self):
+        set_list = []
+        ctrl_ids = {}
+        queries = {}
+
+        for qc in self._query_controls():
+            name = self._var_name(qc.name)
+            ctrl_ids[name] = qc.id
+            queries[qc.id] = (name, qc)
+
+        self.ctrl_ids = ctrl_ids
+
+        readable = [i for i, (_, qc) in queries.items()
+                    if not qc.flags & self.CTRL_FLAG_WRITE_ONLY]
+        values = self._get_values(readable)
+
+        for ctrl_id, (name, qc) in queries.items():
+            entry = self._ctrl_to_entry(name, qc)
+
+            if ctrl_id in values:
+                entry['value'] = values[ctrl_id]
+
+            set_list.append(entry)
+
+        return set_list
+
+    def get_resolutions(self):
+        res_list = set()
+        fmt = v4l2_fmtdesc(type=self.BUF_TYPE_VIDEO_CAPTURE)
+
+        while self._enum(self.VIDIOC_ENUM_FMT, fmt):
+            size = v4l2_frmsizeenum(pixel_format=fmt.pixelformat)
+
+            while self._enum(self.VIDIOC_ENUM_FRAMESIZES, size):
+
+                if size.type == self.FRMSIZE_TYPE_DISCRETE:
+                    res_list.add((size.size.discrete.width,
+                                  size.size.discrete.height))
+                else:
+                    step = size.size.stepwise
+                    res_list.add((step.min_width, step.min_height))
+                    res_list.add((step.max_width, step.max_height))
+
+                size.index += 1
+
+            fmt.index += 1
+
+        return list(res_list)
+
+    def set_controls(self, settings):
+
+        if self.ctrl_ids is None:
+            self.ctrl_ids = {self._var_name(qc.name): qc.id
+                             for qc in self._query_controls()}
+
+        ctrls = (v4l2_ext_control * len(settings))()
+
+        for ctrl, s in zip(ctrls, settings):
+
+            try:
+                ctrl.id = self.ctrl_ids[s['name']]
+            except KeyError:
+                raise SettingsError('{d}: unknown control {n}'.format(
+                    d=self.dev, n=s['name']))
+
+            ctrl.data.value = int(s['value'])
+
+        ext = v4l2_ext_controls(which=self.CTRL_WHICH_CUR_VAL,
+                                count=len(settings), controls=ctrls)
+
+        try:
+            self._ioctl(self.VIDIOC_S_EXT_CTRLS, ext)
+        except OSError as e:
+            name = settings[min(ext.error_idx, len(settings) - 1)]['name']
+            raise SettingsError('{d}: failed to set {n}: {e}'.format(
+                d=self.dev, n=name, e=os.strerror(e.errno)))
+
+    def _ioctl(self, request, arg):
+        fcntl.ioctl(self.fd, request, arg)
+
+        return arg
+
+    def _enum(self, request, arg):
+
+        try:
+            self._ioctl(request, arg)
+        except OSError as e:
+
+            if e.errno == errno.EINVAL:
+                return False
+
+            raise
+
+        return True
+
+    def _query_controls(self):
+        qc = v4l2_queryctrl(id=self.CTRL_FLAG_NEXT_CTRL)
+
+        while self._enum(self.VIDIOC_QUERYCTRL, qc):
+            next_id = qc.id | self.CTRL_FLAG_NEXT_CTRL
+
+            if qc.type in self.CTRL_TYPES and \
+                    not qc.flags & self.CTRL_FLAG_DISABLED:
+                yield qc
+
+            qc = v4l2_queryctrl(id=next_id)
+
+    def _get_values(self, ctrl_ids):
+        values = {}
+
+        if not ctrl_ids:
+            return values
+
+        ctrls = (v4l2_ext_control * len(ctrl_ids))()
+
+        for ctrl, ctrl_id in zip(ctrls, ctrl_ids):
+            ctrl.id = ctrl_id
+
+        ext = v4l2_ext_controls(which=self.CTRL_WHICH_CUR_VAL,
+                                count=len(ctrl_ids), controls=ctrls)
+
+        try:
+            self._ioctl(self.VIDIOC_G_EXT_CTRLS, ext)
+        except OSError:
+            # A single unreadable control fails the whole batch, so fall back
+            # to reading them one by one:
+            if len(ctrl_ids) == 1:
+                return values
+
+            for ctrl_id in ctrl_ids:
+                values.update(self._get_values([ctrl_id]))
+
+            return values
+
+        for ctrl in ctrls:
+            values[ctrl.id] = ctrl.data.value
+
+        return values
+
+    def _ctrl_to_entry(self, name, qc):
+        param_type = self.CTRL_TYPES[qc.type]
+        entry = {
+            'name': name,
+            'type': param_type,
+        }
+
+        if param_type != 'bool':
+            entry['min'] = qc.minimum
+            entry['max'] = qc.maximum
+
+        if param_type == 'int':
+            entry['step'] = qc.step
+
+        entry['default'] = qc.default_value
+
+        flags = [n for f, n in self.CTRL_FLAGS if qc.flags & f]
+
+        if flags:
+            entry['flags'] = ','.join(flags)
+
+        if param_type in ('menu', 'intmenu'):
+            entry['menu'] = self._query_menu(qc)
+
+        return entry
+
+    def _query_menu(self, qc):
+        menu = {}
+
+        for i in range(qc.minimum, qc.maximum + 1):
+            qm = v4l2_querymenu(id=qc.id, index=i)
+
+            # Menus may have holes, which are reported as EINVAL:
+            if not self._enum(self.VIDIOC_QUERYMENU, qm):
+                continue
+
+            if qc.type == 3:
+                menu[i] = qm.menu.name.decode('utf-8', 'replace')
+            else:
+                menu[i] = str(qm.menu.value)
+
+        return menu
+
+    @staticmethod
+    def _var_name(name):
+        # Same control name mangling as v4l2-ctl, i.e. "Exposure, Auto"
+        # becomes "exposure_auto":
+        name = name.decode('utf-8', 'replace').lower()
+
+        return '_'.join(re.findall(r'[a-z0-9]+', name))
+
+
+class FakeBackend(ControlBackend):
+
+    DEFAULT_CONTROLS = [
+        {'name': 'brightness', 'type': 'int', 'min': -64, 'max': 64,
+         'step': 1, 'default': 0, 'value': 0},
+        {'name': 'contrast', 'type': 'int', 'min': 0, 'max': 95,
+         'step': 1, 'default': 32, 'value': 32},
+        {'name': 'exposure_absolute', 'type': 'int', 'min': 3, 'max': 2047,
+         'step': 1, 'default': 166, 'value': 166, 'flags': 'inactive'},
+        {'name': 'exposure_auto', 'type': 'menu', 'min': 0, 'max': 3,
+         'default': 3, 'value': 3,
+         'menu': {1: 'Manual Mode', 3: 'Aperture Priority Mode'}},
+        {'name': 'focus_auto', 'type': 'bool', 'default': 1, 'value': 1},
+        {'name': 'white_balance_temperature_auto', 'type': 'bool',
+         'default': 1, 'value': 1},
+    ]
+    DEFAULT_RESOLUTIONS = [(640, 480), (800, 600), (1280, 720), (1600, 1200)]
+
+    DEFAULT_INFO = {
+        'driver': 'fake',
+        'card': 'Fake Camera',
+        'bus_info': 'fake:0',
+        'capabilities': 0x84200001,
+        'device_caps': 0x04200001,
+    }
+
+    def __init__(self, controls=None, resolutions=None, info=None):
+        self.controls = copy.deepcopy(controls or self.DEFAULT_CONTROLS)
+        self.resolutions = list(resolutions or self.DEFAULT_RESOLUTIONS)
+        self.info = dict(info or self.DEFAULT_INFO)
+        self.writes = []
+
+    def get_info(self):
+        return dict(self.info)
+
+    def get_controls(self):
+        return copy.deepcopy(self.controls)
+
+    def get_resolutions(self):
+        return list(self.resolutions)
+
+    def set_controls(self, settings):
+        controls = {c['name']: c for c in self.controls}
+
+        for s in settings:
+
+            if s['name'] not in controls:
+                raise SettingsError('unknown control {n}'.format(n=s['name']))
+
+        for s in settings:
+            controls[s['name']]['value'] = int(s['value'])
+
+        self.writes.append([(s['name'], int(s['value'])) for s in settings])
@@ -0,0 +1,92 @@
+import os
+import time
+from threading import Lock
+from collections import deque
+
+from .exceptions import FrameError
+
+
+class VideoFrameBuffer(object):
+
+    MAX_FRAMES = 300
+    MAX_BYTES = 256 * 2 ** 20
+
+    def __init__(self, max_frames=MAX_FRAMES, max_bytes=MAX_BYTES):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+
+        self.lock = Lock()
+        self.frames = deque()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame):
+        # Consumers like the preview decode and convert the very frames which
+        # are buffered here, so only the data is kept, or those would count
+        # towards no limit:
+        frame = frame.bare()
+
+        with self.lock:
+            self.frames.append((time.monotonic(), frame))
+            self.nbytes += frame.nbytes
+
+            # Both limits are enforced by dropping the oldest frames, but the
+            # newest one is always kept:
+            while len(self.frames) > 1 and (
+                    len(self.frames) > self.max_frames or
+                    self.nbytes > self.max_bytes):
+                _, old_frame = self.frames.popleft()
+                self.nbytes -= old_frame.nbytes
+
+    def clear(self):
+
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+    def latest(self):
+
+        with self.lock:
+
+            if not self.frames:
+                return
+
+            return self.frames[-1][1]
+
+    def since(self, seconds):
+        t_start = time.monotonic() - seconds
+
+        with self.lock:
+            return [f for t, f in self.frames if t >= t_start]
+
+    @staticmethod
+    def save(frames, dirname, ext='.jpg'):
+        # Saving is the only part which needs OpenCV:
+        from .stream import VideoStream
+
+        os.makedirs(dirname, exist_ok=True)
+        filenames = []
+
+        for i, frame in enumerate(frames):
+            filename = os.path.join(
+                dirname, 'frame_{i:06d}{e}'.format(i=i, e=ext))
+
+            # Compressed frames already are JPEG images:
+            if frame.is_compressed and ext == '.jpg':
+
+                with open(filename, 'wb') as f:
+                    f.write(frame.data.tobytes())
+
+            else:
+
+                # Corrupt frames are left out:
+                try:
+                    VideoStream.save(frame, filename)
+                except FrameError:
+                    continue
+
+            filenames.append(filename)
+
+        return filenames
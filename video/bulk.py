@@ -0,0 +1,108 @@
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .settings import VideoDeviceSettings
+
+
+class VideoSettingsBulkApply(object):
+
+    MAX_WORKERS = 16
+
+    def __init__(self, workers=None, timeout=None, logger=None):
+        self.workers = workers or self.MAX_WORKERS
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger()
+
+    @staticmethod
+    def load_profile(filename):
+
+        with open(filename, 'r') as f:
+            cfg = json.load(f)
+
+        return cfg.get('settings') or []
+
+    def apply(self, profiles):
+        # Maps device paths to settings lists. Every device is configured by
+        # its own worker, so it all takes about as long as the slowest one:
+        items = sorted(profiles.items())
+
+        if not items:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda item: self.apply_device(*item),
+                                 items))
+
+    def apply_device(self, path, settings):
+        report = {
+            'path': path,
+            'ok': False,
+            'error': None,
+            'controls': len(settings),
+            'mismatches': [],
+            'timings': {},
+        }
+        timings = report['timings']
+        t_start = time.perf_counter()
+
+        def lap(name, t):
+            timings[name] = round(1000 * (time.perf_counter() - t), 3)
+
+        try:
+            dev = VideoDeviceSettings(path, timeout=self.timeout,
+                                      logger=self.logger)
+        except Exception as e:
+            report['error'] = str(e)
+            lap('total', t_start)
+            return report
+
+        lap('open', t_start)
+
+        try:
+            t = time.perf_counter()
+            dev.set(settings)
+            lap('set', t)
+
+            # Read the controls back from the device, not from the cache, to
+            # see which values actually took:
+            t = time.perf_counter()
+            current = dev.get(refresh=True)
+            lap('readback', t)
+
+            report['mismatches'] = self.diff(settings, current)
+            report['ok'] = not report['mismatches']
+        except Exception as e:
+            report['error'] = str(e)
+            self.logger.warning('{p} :: {e}'.format(p=path, e=e))
+        finally:
+            dev.close()
+
+        lap('total', t_start)
+
+        return report
+
+    @staticmethod
+    def diff(settings, current):
+        current = {s['name']: s for s in current}
+        mismatches = []
+
+        for entry in settings:
+            actual = current.get(entry['name'])
+
+            # Inactive controls are not written, whether the profile or the
+            # device says so:
+            if VideoDeviceSettings.is_inactive(entry) or (
+                    actual is not None and
+                    VideoDeviceSettings.is_inactive(actual)):
+                continue
+
+            if actual is None or str(actual['value']) != str(entry['value']):
+                mismatches.append({
+                    'name': entry['name'],
+                    'expected': entry['value'],
+                    'actual': None if actual is None else actual['value'],
+                })
+
+        return mismatches
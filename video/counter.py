@@ -1,19 +1,37 @@
 import time
+import json
+from threading import Lock
+from collections import deque
+from contextlib import contextmanager
 
 
 class VideoFrameCounter(object):
 
-    def __init__(self):
+    WINDOW = 300
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=WINDOW):
         self.stream = None
         self.fps = None
 
+        # Both the latencies and the event times are kept in fixed-size
+        # windows, so the memory does not grow however long it runs:
+        self.window = window
+        self.lock = Lock()
+        self.latencies = {}
+        self.events = {}
+
     def start(self):
         self.stream = {}
         self.fps = None
         self.t_start = time.time()
 
     def update(self, name):
-        self.stream[name] = self.stream.get(name, 0) + 1
+
+        if self.stream is not None:
+            self.stream[name] = self.stream.get(name, 0) + 1
+
+        self.tick(name)
 
     def stop(self):
 
@@ -28,3 +46,106 @@ class VideoFrameCounter(object):
 
         self.stream = None
 
+    def tick(self, name):
+
+        with self.lock:
+            events = self.events.setdefault(name, deque(maxlen=self.window))
+            events.append(time.monotonic())
+
+    def add(self, name, elapsed):
+
+        with self.lock:
+            samples = self.latencies.setdefault(
+                name, deque(maxlen=self.window))
+            samples.append(elapsed)
+
+    @contextmanager
+    def measure(self, name):
+        t_start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t_start)
+
+    def reset(self):
+
+        with self.lock:
+            self.latencies = {}
+            self.events = {}
+
+    def rate(self, name):
+
+        with self.lock:
+            events = list(self.events.get(name, ()))
+
+        if len(events) < 2 or events[-1] == events[0]:
+            return
+
+        return (len(events) - 1) / (events[-1] - events[0])
+
+    def latency(self, name):
+
+        with self.lock:
+            samples = sorted(self.latencies.get(name, ()))
+
+        if not samples:
+            return
+
+        stats = {
+            'count': len(samples),
+            'mean': 1000 * sum(samples) / len(samples),
+            'max': 1000 * samples[-1],
+        }
+
+        # Nearest-rank percentiles, in milliseconds:
+        for p in self.PERCENTILES:
+            i = max(0, -(-p * len(samples) // 100) - 1)
+            stats['p{p}'.format(p=p)] = 1000 * samples[i]
+
+        return stats
+
+    def stats(self):
+
+        with self.lock:
+            names = set(self.latencies) | set(self.events)
+
+        stats = {}
+
+        for name in sorted(names):
+            entry = {}
+            fps = self.rate(name)
+
+            if fps is not None:
+                entry['fps'] = round(fps, 2)
+
+            latency = self.latency(name)
+
+            if latency is not None:
+                entry.update({k: round(v, 3) for k, v in latency.items()})
+
+            stats[name] = entry
+
+        return stats
+
+    def summary(self):
+        lines = []
+
+        for name, entry in self.stats().items():
+            toks = [name]
+
+            if 'fps' in entry:
+                toks.append('{f:.1f} fps'.format(f=entry['fps']))
+
+            if 'p50' in entry:
+                toks.append('p50/p95/p99 {a:.1f}/{b:.1f}/{c:.1f} ms'.format(
+                    a=entry['p50'], b=entry['p95'], c=entry['p99']))
+
+            lines.append('  '.join(toks))
+
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+
+        with open(filename, 'w') as f:
+            json.dump(self.stats(), f, indent=2)
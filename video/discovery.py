@@ -0,0 +1,180 @@
+import os
+import json
+import logging
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from .settings import VideoDeviceSettings
+from .backends import IoctlBackend
+
+
+class VideoDeviceDiscovery(object):
+
+    CACHE_PATH = os.path.join(
+        os.path.expanduser('~'), '.cache', 'camerado', 'devices.json')
+    MAX_WORKERS = 8
+
+    CAP_VIDEO_CAPTURE = 0x00000001
+    CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+
+    def __init__(self, cache_path=None, workers=None, timeout=None,
+                 logger=None):
+        self.cache_path = cache_path or self.CACHE_PATH
+        self.workers = workers or self.MAX_WORKERS
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger()
+
+        self.cache_lock = Lock()
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+
+        try:
+
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        dirname = os.path.dirname(self.cache_path)
+        tmp_path = self.cache_path + '.tmp'
+
+        with self.cache_lock:
+            cache = json.dumps(self.cache, indent=2)
+
+        try:
+            os.makedirs(dirname, exist_ok=True)
+
+            with open(tmp_path, 'w') as f:
+                f.write(cache)
+
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.logger.warning('Failed to save device cache to {p}: {e}'
+                                .format(p=self.cache_path, e=e))
+
+    def cached(self, nodes=None):
+        # Devices known from the previous runs which are still on the same
+        # nodes. This is what fills the menus before probe() has finished:
+        dev_list = []
+
+        if nodes is None:
+            nodes = VideoDeviceSettings.device_list()
+
+        with self.cache_lock:
+            cache = dict(self.cache)
+
+        for path in nodes:
+
+            # After a replug or renumbering, another device may be on the
+            # node now, so the entry is only trusted if its key matches:
+            entry = cache.get(self.node_key(path))
+
+            if entry is None or path not in entry['nodes']:
+                continue
+
+            dev_list.append({
+                'path': path,
+                'card': entry['card'],
+                'resolutions': [tuple(r) for r in entry['nodes'][path]],
+            })
+
+        return dev_list
+
+    def resolutions(self, path):
+
+        for dev in self.cached([path]):
+            return dev['resolutions']
+
+    @staticmethod
+    def key(info):
+        return '{d}:{b}'.format(d=info['driver'], b=info['bus_info'])
+
+    def node_key(self, path):
+        # A single QUERYCAP ioctl, much cheaper than probing the node:
+        try:
+            backend = IoctlBackend(path)
+        except OSError:
+            return
+
+        try:
+            return self.key(backend.get_info())
+        finally:
+            backend.close()
+
+    def probe(self):
+        nodes = VideoDeviceSettings.device_list()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.probe_node, nodes))
+
+        # Devices which are not connected at the moment keep their entries,
+        # but no node probed just now may point to a stale entry:
+        with self.cache_lock:
+            cache = {}
+
+            for key, entry in self.cache.items():
+                entry = dict(entry, nodes={
+                    p: r for p, r in entry['nodes'].items() if p not in nodes})
+
+                if entry['nodes']:
+                    cache[key] = entry
+
+        dev_list = []
+
+        for path, info in zip(nodes, results):
+
+            if info is None:
+                continue
+
+            entry = cache.setdefault(self.key(info), {
+                'driver': info['driver'],
+                'bus_info': info['bus_info'],
+                'card': info['card'],
+                'nodes': {},
+            })
+            entry['card'] = info['card']
+            entry['nodes'][path] = info['resolutions']
+
+            dev_list.append({
+                'path': path,
+                'card': info['card'],
+                'resolutions': info['resolutions'],
+            })
+
+        with self.cache_lock:
+            self.cache = cache
+
+        self.save_cache()
+
+        return dev_list
+
+    def probe_node(self, path):
+
+        try:
+            settings = VideoDeviceSettings(path, timeout=self.timeout,
+                                           logger=self.logger)
+        except Exception as e:
+            self.logger.warning('{p} :: {e}'.format(p=path, e=e))
+            return
+
+        try:
+            info = settings.get_info()
+            caps = info['device_caps'] or info['capabilities']
+
+            # Skip metadata and output-only nodes, e.g. the second node UVC
+            # cameras register for each device:
+            if not caps & (self.CAP_VIDEO_CAPTURE |
+                           self.CAP_VIDEO_CAPTURE_MPLANE):
+                return
+
+            info['resolutions'] = settings.get_resolutions()
+        except Exception as e:
+            self.logger.warning('{p} :: {e}'.format(p=path, e=e))
+            return
+        finally:
+            settings.close()
+
+        return info
@@ -1,2 +1,6 @@
 class SettingsError(Exception):
     pass
+
+
+class FrameError(Exception):
+    pass
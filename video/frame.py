@@ -0,0 +1,174 @@
+import time
+
+import cv2
+
+from .exceptions import FrameError
+
+
+class VideoFrame(object):
+
+    CONVERSIONS = {
+        ('bgr', 'rgb'): cv2.COLOR_BGR2RGB,
+        ('bgr', 'gray'): cv2.COLOR_BGR2GRAY,
+        ('rgb', 'bgr'): cv2.COLOR_RGB2BGR,
+        ('rgb', 'gray'): cv2.COLOR_RGB2GRAY,
+        ('gray', 'bgr'): cv2.COLOR_GRAY2BGR,
+        ('gray', 'rgb'): cv2.COLOR_GRAY2RGB,
+    }
+
+    # Compressed (MJPEG) frames can be decoded directly at 1/2, 1/4 or 1/8 of
+    # their size, which is much cheaper than decoding and resizing:
+    DECODE_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+
+    MAX_AGE = 10
+
+    def __init__(self, data, fmt='bgr', size=None, seq=0, timestamp=None,
+                 t_received=None):
+        self.data = data
+        self.format = fmt
+        self.frame_size = size
+
+        # Where the frame came from: its number in the stream, the driver (or
+        # container) timestamp and the time.monotonic() it was received at,
+        # all in seconds. Frames derived from it keep them:
+        self.seq = seq
+        self.timestamp = timestamp
+        self.t_received = t_received
+
+        # Every layout (and decoding scale) is computed at most once, by the
+        # first consumer that asks for it:
+        self.layouts = {fmt: data}
+        self.decoded = {}
+
+    @property
+    def is_compressed(self):
+        return self.format == 'mjpeg'
+
+    @property
+    def shape(self):
+
+        if self.is_compressed:
+            w, h = self.size
+            return (h, w, 3)
+
+        return self.data.shape
+
+    @property
+    def size(self):
+
+        if self.is_compressed:
+            return self.frame_size or self.decode().size
+
+        h, w = self.data.shape[:2]
+
+        return (w, h)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def decode(self, scale=1):
+
+        if not self.is_compressed:
+            return self
+
+        frame = self.decoded.get(scale)
+
+        if frame is None:
+            data = cv2.imdecode(self.data, self.DECODE_FLAGS[scale])
+
+            # Devices do send corrupt or truncated buffers now and then:
+            if data is None:
+                raise FrameError('Failed to decode frame {s}'.format(
+                    s=self.seq))
+
+            frame = self._derive(data, 'bgr')
+            self.decoded[scale] = frame
+
+        return frame
+
+    def decode_scale(self, size):
+        w, h = self.size
+        target_w, target_h = size
+
+        for scale in (8, 4, 2):
+
+            if w // scale >= target_w and h // scale >= target_h:
+                return scale
+
+        return 1
+
+    def to(self, fmt):
+
+        if self.is_compressed:
+            return self.decode().to(fmt)
+
+        data = self.layouts.get(fmt)
+
+        if data is None:
+            code = self.CONVERSIONS[(self.format, fmt)]
+            data = cv2.cvtColor(self.data, code)
+            self.layouts[fmt] = data
+
+        return data
+
+    def rgb(self):
+        return self.to('rgb')
+
+    def bgr(self):
+        return self.to('bgr')
+
+    def gray(self):
+        return self.to('gray')
+
+    def resize(self, size, interpolation=cv2.INTER_LINEAR):
+
+        if self.is_compressed:
+            frame = self.decode(self.decode_scale(size))
+            return frame.resize(size, interpolation)
+
+        if size == self.size:
+            return self
+
+        data = cv2.resize(self.data, size, interpolation=interpolation)
+
+        return self._derive(data, self.format)
+
+    def crop(self, box):
+        # A view into the same pixels, nothing is copied:
+        if self.is_compressed:
+            return self.decode().crop(box)
+
+        xmin, ymin, xmax, ymax = box
+
+        return self._derive(self.data[ymin:ymax, xmin:xmax], self.format)
+
+    def bare(self):
+        # The same data without anything decoded or converted from it, which
+        # may otherwise be cached on the frame later:
+        return self._derive(self.data, self.format, self.frame_size)
+
+    def copy(self):
+        return self._derive(self.data.copy(), self.format, self.frame_size)
+
+    def age(self):
+        # V4L2 timestamps come from CLOCK_MONOTONIC like time.monotonic(), so
+        # they give the age since capture. Other ones (e.g. positions in a
+        # file) make no sense as ages, then it is the age since receipt:
+        t_now = time.monotonic()
+
+        if self.timestamp is not None and \
+                0 <= t_now - self.timestamp < self.MAX_AGE:
+            return t_now - self.timestamp
+
+        if self.t_received is not None:
+            return t_now - self.t_received
+
+    def _derive(self, data, fmt, size=None):
+        return VideoFrame(data, fmt, size, self.seq, self.timestamp,
+                          self.t_received)
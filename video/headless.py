@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import logging
+
+from .roi import VideoROI
+from .exceptions import FrameError
+from .stream import VideoStream
+from .motion import VideoMotionDetector
+from .counter import VideoFrameCounter
+from .recorder import VideoRecorder
+from .settings import VideoDeviceSettings
+
+
+class HeadlessCapture(object):
+
+    MAX_READ_FAILURES = 10
+    RETRY_DELAY = 0.1
+
+    def __init__(self, path='/dev/video0', size=(640, 480), settings=None,
+                 roi=None, roi_stats=False, dump_dir=None, dump_every=1,
+                 record=None, drop_policy=VideoRecorder.DROP_OLDEST,
+                 motion_threshold=None, logger=None):
+        self.path = path
+        self.size = size
+        self.settings = settings
+        self.roi = VideoROI(roi or [])
+        self.roi_stats = roi_stats
+        self.dump_dir = dump_dir
+        self.dump_every = dump_every
+        self.record = record
+        self.drop_policy = drop_policy
+        self.motion = None
+
+        if motion_threshold is not None:
+            self.motion = VideoMotionDetector(motion_threshold,
+                                              self.roi.roi_list)
+        self.logger = logger or logging.getLogger()
+        self.counter = VideoFrameCounter()
+
+    @classmethod
+    def from_profile(cls, filename, path=None, **kwargs):
+
+        with open(filename, 'r') as f:
+            cfg = json.load(f)
+
+        return cls(path or cfg['path'], tuple(cfg['resolution']),
+                   settings=cfg['settings'], roi=cfg['roi'], **kwargs)
+
+    def apply_settings(self):
+
+        if not self.settings or not self.path.startswith('/dev/'):
+            return
+
+        settings = VideoDeviceSettings(self.path, logger=self.logger)
+
+        try:
+            settings.set(self.settings)
+        finally:
+            settings.close()
+
+    def run(self, frames=None, duration=None):
+        self.apply_settings()
+
+        if self.dump_dir is not None:
+            os.makedirs(self.dump_dir, exist_ok=True)
+
+        # Raw MJPEG recordings get the frames as the device delivers them,
+        # the other stages decode them (at the scale they need) themselves:
+        raw = self.record is not None and os.path.splitext(
+            self.record)[1].lower() in VideoRecorder.MJPEG_EXTENSIONS
+
+        stream = VideoStream(self.path, self.size, counter=self.counter,
+                             raw=raw)
+
+        if not stream.is_opened():
+            raise IOError('Failed to open {p}'.format(p=self.path))
+
+        recorder = None
+
+        if self.record is not None:
+            recorder = VideoRecorder(self.record, stream.frame_rate() or 30,
+                                     policy=self.drop_policy)
+            recorder.start()
+
+        n = 0
+        corrupt = 0
+        failed = 0
+        failures = 0
+        roi_stats = None
+        roi_totals = None
+        roi_frames = 0
+        t_start = time.time()
+
+        try:
+
+            while frames is None or n < frames:
+
+                if duration is not None and time.time() - t_start > duration:
+                    break
+
+                # Frames are read back to back at the full source rate, there
+                # is no point in draining when nothing else is slowing us:
+                with self.counter.measure('read'):
+                    frame = stream.read(drain=False)
+
+                # A file has ended, but a device may just have missed a frame.
+                # Only a device that keeps failing ends the capture early:
+                if frame is None:
+
+                    if not stream.is_device:
+                        break
+
+                    failed += 1
+                    failures += 1
+
+                    if failures >= self.MAX_READ_FAILURES:
+                        break
+
+                    time.sleep(self.RETRY_DELAY)
+                    continue
+
+                failures = 0
+                self.counter.tick('capture')
+
+                if recorder is not None:
+                    recorder.put(frame)
+
+                # Frames which did not change (in any ROI) keep the previous
+                # statistics and are not dumped again. Corrupt ones are only
+                # counted:
+                try:
+                    changed = True
+
+                    if self.motion is not None:
+
+                        with self.counter.measure('motion'):
+                            changed = self.motion.update(frame)
+
+                    if changed and self.roi_stats and self.roi:
+
+                        with self.counter.measure('roi'):
+                            roi_stats = self.roi.stats(frame)
+
+                    if changed and self.dump_dir is not None and \
+                            n % self.dump_every == 0:
+
+                        with self.counter.measure('dump'):
+                            self.dump(frame, n)
+
+                except FrameError:
+                    corrupt += 1
+
+                # Unchanged frames count with the statistics of the last
+                # changed one:
+                if roi_stats is not None:
+                    roi_totals = self.add_stats(roi_totals, roi_stats)
+                    roi_frames += 1
+
+                n += 1
+        finally:
+            stream.release()
+
+            if recorder is not None:
+                recorder.stop()
+
+        t_elapsed = time.time() - t_start
+
+        report = {
+            'path': self.path,
+            'resolution': list(self.size),
+            'frames': n,
+            'elapsed': round(t_elapsed, 3),
+            'fps': round(n / t_elapsed, 2) if t_elapsed else None,
+            'dropped': stream.dropped,
+            'corrupt': corrupt,
+            'failed': failed,
+            'stages': self.counter.stats(),
+        }
+
+        if roi_totals is not None:
+            report['roi'] = self.average_stats(roi_totals, roi_frames)
+            report['roi_frames'] = roi_frames
+
+        if recorder is not None:
+            report['recording'] = recorder.status()
+
+        if self.motion is not None:
+            report['motion'] = self.motion.status()
+
+        return report
+
+    @staticmethod
+    def add_stats(totals, stats):
+
+        if totals is None:
+            return [dict(roi) for roi in stats]
+
+        for total, roi in zip(totals, stats):
+
+            for key, value in roi.items():
+
+                if key == 'hist':
+                    total[key] = [a + b for a, b in zip(total[key], value)]
+                else:
+                    total[key] += value
+
+        return totals
+
+    @staticmethod
+    def average_stats(totals, n):
+        # The histograms are summed over the run, everything else is the
+        # average per frame:
+        return [{key: value if key == 'hist' else value / n
+                 for key, value in total.items()}
+                for total in totals]
+
+    def dump(self, frame, n):
+
+        if not self.roi:
+            filename = 'frame_{n:06d}.png'.format(n=n)
+            VideoStream.save(frame, os.path.join(self.dump_dir, filename))
+            return
+
+        for i, crop in enumerate(self.roi.crops(frame), start=1):
+            filename = 'frame_{n:06d}_roi_{i}.png'.format(n=n, i=i)
+            VideoStream.save(crop, os.path.join(self.dump_dir, filename))
@@ -0,0 +1,426 @@
+import os
+import json
+import time
+import bisect
+import logging
+from threading import Lock, Event
+from collections import OrderedDict
+
+import cv2
+
+from .stream import VideoStream
+
+
+class VideoFileIndex(object):
+
+    VERSION = 1
+    SUFFIX = '.index.json'
+
+    def __init__(self, timestamps, keyframes, fps=None, file_key=None):
+        # Presentation timestamps of every frame in seconds, and the numbers
+        # of the frames decoding can start from:
+        self.timestamps = timestamps
+        self.keyframes = keyframes or [0]
+        self.fps = fps
+        self.file_key = file_key
+
+        # Frames can only be told apart by their timestamps if these keep
+        # increasing, otherwise frames are counted from the last seek:
+        self.is_exact = all(a < b for a, b in zip(timestamps, timestamps[1:]))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def index_path(cls, path):
+        return path + cls.SUFFIX
+
+    @staticmethod
+    def key(path):
+        stat = os.stat(path)
+
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @classmethod
+    def open(cls, path, logger=None):
+        # The index is built once, on the first open, and reused as long as
+        # the file stays the same:
+        index = cls.load(path)
+
+        if index is None:
+            index = cls.build(path)
+            index.save(path, logger)
+
+        return index
+
+    @classmethod
+    def load(cls, path):
+
+        try:
+
+            with open(cls.index_path(path), 'r') as f:
+                cfg = json.load(f)
+
+            if cfg['version'] != cls.VERSION or cfg['key'] != cls.key(path):
+                return
+
+            return cls(cfg['timestamps'], cfg['keyframes'], cfg['fps'],
+                       cfg['key'])
+
+        except (OSError, ValueError, KeyError):
+            return
+
+    @classmethod
+    def build(cls, path):
+        # The packets are only demuxed, not decoded, which takes a fraction
+        # of playing the file:
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_FORMAT, -1])
+        demuxed = cap.isOpened()
+
+        if not demuxed:
+            cap = cv2.VideoCapture(path)
+
+        if not cap.isOpened():
+            raise IOError('Failed to open {p}'.format(p=path))
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        timestamps = []
+        keyframes = []
+
+        try:
+
+            while cap.grab():
+
+                if demuxed and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    keyframes.append(len(timestamps))
+
+                timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+
+        finally:
+            cap.release()
+
+        # Without keyframe flags every frame is taken as one, so seeking is
+        # left to OpenCV:
+        if not keyframes:
+            keyframes = list(range(len(timestamps)))
+
+        return cls(timestamps, keyframes, fps, cls.key(path))
+
+    def save(self, path, logger=None):
+        index_path = self.index_path(path)
+        tmp_path = index_path + '.tmp'
+        cfg = {
+            'version': self.VERSION,
+            'key': self.file_key,
+            'fps': self.fps,
+            'timestamps': self.timestamps,
+            'keyframes': self.keyframes,
+        }
+
+        # Next to a file in a read-only directory, the index is just built
+        # again on the next open:
+        try:
+
+            with open(tmp_path, 'w') as f:
+                json.dump(cfg, f)
+
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            (logger or logging.getLogger()).warning(
+                'Failed to save index to {p}: {e}'.format(p=index_path, e=e))
+
+    @property
+    def duration(self):
+
+        if not self.timestamps:
+            return 0
+
+        return self.timestamps[-1] + (1 / self.fps if self.fps else 0)
+
+    def keyframe(self, n):
+        return self.keyframes[max(bisect.bisect_right(self.keyframes, n) - 1,
+                                  0)]
+
+    def frame_at(self, t):
+        # The frame shown at time t, i.e. the last one starting before it:
+        return max(bisect.bisect_right(self.timestamps, t) - 1, 0)
+
+    def nearest(self, t):
+        i = bisect.bisect_left(self.timestamps, t)
+
+        if i == len(self.timestamps) or i > 0 and \
+                t - self.timestamps[i - 1] < self.timestamps[i] - t:
+            i -= 1
+
+        return max(i, 0)
+
+
+class VideoFrameCache(object):
+
+    MAX_BYTES = 256 * 2 ** 20
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+
+        self.lock = Lock()
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get(self, n):
+
+        with self.lock:
+            data = self.frames.get(n)
+
+            if data is None:
+                self.misses += 1
+                return
+
+            self.frames.move_to_end(n)
+            self.hits += 1
+
+            return data
+
+    def put(self, n, data):
+
+        with self.lock:
+            old_data = self.frames.pop(n, None)
+
+            if old_data is not None:
+                self.nbytes -= old_data.nbytes
+
+            self.frames[n] = data
+            self.nbytes += data.nbytes
+
+            # The least recently used frames go first, but the newest one is
+            # always kept:
+            while len(self.frames) > 1 and self.nbytes > self.max_bytes:
+                _, old_data = self.frames.popitem(last=False)
+                self.nbytes -= old_data.nbytes
+
+    def clear(self):
+
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+    def status(self):
+
+        with self.lock:
+            return {
+                'frames': len(self.frames),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class VideoFileStream(VideoStream):
+
+    CACHE_BYTES = VideoFrameCache.MAX_BYTES
+    POLL_DELAY = 0.1
+
+    # OpenCV seeks to some frames before the one asked for and decodes its
+    # way up to it, which costs about as much as grabbing this many frames:
+    SEEK_FRAMES = 16
+
+    def __init__(self, path, size=(640, 480), fps=None, counter=None,
+                 raw=False, cache_bytes=CACHE_BYTES, logger=None):
+        super().__init__(path, size, fps, counter, raw)
+
+        if not self.is_opened():
+            raise IOError('Failed to open {p}'.format(p=path))
+
+        self.index = VideoFileIndex.open(path, logger)
+        self.cache = VideoFrameCache(cache_bytes)
+
+        # The decoder position (the frame last grabbed from the capture) is
+        # only touched under the decode lock. The position is the number of
+        # the frame last published:
+        self.decode_lock = Lock()
+        self.decoded = None
+        self.position = None
+
+        self.control_lock = Lock()
+        self.target = 0
+        self.playing = Event()
+        self.playing.set()
+        self.wakeup = Event()
+
+    @property
+    def is_seekable(self):
+        return True
+
+    @property
+    def is_playing(self):
+        return self.playing.is_set()
+
+    @property
+    def frame_count(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        return self.index.duration
+
+    def play(self):
+
+        # Playing from the end starts over:
+        if self.position is not None and \
+                self.position >= self.frame_count - 1:
+            self.seek(0)
+
+        self.playing.set()
+        self.wakeup.set()
+
+    def pause(self):
+        self.playing.clear()
+
+    def seek(self, n):
+
+        # Requests are not queued, when scrubbing only the latest one is
+        # decoded:
+        with self.control_lock:
+            self.target = min(max(int(n), 0), self.frame_count - 1)
+
+        self.wakeup.set()
+
+    def seek_time(self, t):
+        self.seek(self.index.frame_at(t))
+
+    def step(self, delta=1):
+        self.pause()
+        self.seek((self.position or 0) + delta)
+
+    def get(self, n):
+        # The frame with number n, decoded from the file or taken from the
+        # cache. Returns None past the end:
+        with self.decode_lock:
+            data = self.cache.get(n)
+
+            if data is None:
+                data = self._decode(n)
+
+        return data
+
+    def _update(self):
+        t_next = time.time()
+
+        while not self.stopped.is_set():
+            self.wakeup.clear()
+
+            with self.control_lock:
+                target, self.target = self.target, None
+
+            seeking = target is not None
+
+            if not seeking:
+
+                if not self.playing.is_set():
+                    self.wakeup.wait(self.POLL_DELAY)
+                    continue
+
+                target = 0 if self.position is None else self.position + 1
+
+                if target >= self.frame_count:
+                    self.playing.clear()
+                    continue
+
+            with self.counter.measure('seek' if seeking else 'decode'):
+                data = self.get(target)
+
+            if data is None:
+                self.playing.clear()
+                continue
+
+            self.timestamp = self.index.timestamps[target]
+            self.t_received = time.monotonic()
+            frame = self._frame(data)
+
+            with self.frame_lock:
+                self.frame = frame
+                self.seq = frame.seq
+                self.position = target
+
+            # Consumers run on the capture thread for every frame, so they
+            # should only hand it over (e.g. to a queue) and return:
+            for consumer in list(self.consumers):
+                consumer(frame)
+
+            self.counter.tick('capture')
+
+            # Playback is paced at the nominal frame rate, seeks are not:
+            if self.playing.is_set() and self.period is not None:
+                t_next = max(t_next + self.period, time.time() - self.period)
+                self.wakeup.wait(max(t_next - time.time(), 0))
+            else:
+                t_next = time.time()
+
+    def _decode(self, n):
+        k = self.index.keyframe(n)
+
+        # Decoding on from the current position is cheaper than seeking, as
+        # long as the target lies not far ahead or no nearer keyframe is in
+        # between:
+        if self.decoded is not None and self.decoded < n and (
+                n - self.decoded <= self.SEEK_FRAMES or k - 1 <= self.decoded):
+            grabbed = self._grab()
+        else:
+
+            # Going backwards, some frames before the target are decoded too,
+            # the next steps back then come from the cache:
+            if self.decoded is not None and n < self.decoded:
+                k = min(k, max(n - self.SEEK_FRAMES, 0))
+
+            grabbed = self._seek(n, k)
+
+        while grabbed:
+            success, data = self.cap.retrieve()
+
+            if not success:
+                break
+
+            # Frames decoded on the way to the target are kept too, so
+            # stepping back through them costs nothing:
+            self.cache.put(self.decoded, data)
+
+            if self.decoded >= n:
+                return data
+
+            grabbed = self._grab()
+
+        self.decoded = None
+
+    def _seek(self, n, k):
+
+        # Not every container seeks exactly to the frame asked for, an
+        # overshoot is fixed by starting from the keyframe before:
+        while True:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, k)
+            self.decoded = k - 1
+
+            if not self._grab():
+                return False
+
+            if self.decoded <= n or k == 0:
+                return True
+
+            k = self.index.keyframe(k - 1)
+
+    def _grab(self):
+
+        if not self.cap.grab():
+            return False
+
+        if self.index.is_exact:
+            self.decoded = self.index.nearest(
+                self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+        else:
+            self.decoded += 1
+
+        return True
@@ -0,0 +1,466 @@
+import time
+import multiprocessing
+from threading import Thread, Event, Lock
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .frame import VideoFrame
+from .stream import VideoStream
+
+
+class VideoFrameRing(object):
+
+    SLOTS = 4
+    FORMATS = ('bgr', 'rgb', 'gray', 'mjpeg')
+    FIELDS = 10
+
+    # Ring header fields:
+    SEQ, DISCARDED, RATE, DROPPED = range(4)
+
+    # Slot fields, times are in nanoseconds and the frame shape takes up to
+    # three fields from SHAPE:
+    SLOT_SEQ, FORMAT, WIDTH, HEIGHT, NDIM, SHAPE = range(6)
+    TIMESTAMP, RECEIVED = range(8, 10)
+
+    def __init__(self, frame_size, slots=SLOTS, name=None):
+        w, h = frame_size
+        self.frame_size = frame_size
+        self.slots = slots
+        self.slot_bytes = w * h * 3
+        self.data_offset = (slots + 1) * self.FIELDS * 8
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=self.data_offset + slots * self.slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.meta = np.ndarray((slots + 1, self.FIELDS), np.int64,
+                               self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self.meta[0, self.SEQ])
+
+    @seq.setter
+    def seq(self, seq):
+        self.meta[0, self.SEQ] = seq
+
+    @property
+    def discarded(self):
+        return int(self.meta[0, self.DISCARDED])
+
+    @property
+    def dropped(self):
+        return int(self.meta[0, self.DROPPED])
+
+    @dropped.setter
+    def dropped(self, dropped):
+        self.meta[0, self.DROPPED] = dropped
+
+    @property
+    def rate(self):
+        rate = int(self.meta[0, self.RATE])
+
+        return rate / 1000 if rate else None
+
+    @rate.setter
+    def rate(self, rate):
+        self.meta[0, self.RATE] = int(1000 * (rate or 0))
+
+    def put(self, frame):
+        data = frame.data
+
+        if data.nbytes > self.slot_bytes or data.ndim > 3:
+            self.meta[0, self.DISCARDED] += 1
+            return
+
+        seq = self.seq + 1
+        i = seq % self.slots
+        slot = self.meta[i + 1]
+
+        # The slot is marked invalid while it is being written, so a reader
+        # which catches it half-way skips it instead of using a torn frame:
+        slot[self.SLOT_SEQ] = 0
+        self._view(i, data.shape)[...] = data
+
+        w, h = frame.size
+        slot[self.FORMAT] = self.FORMATS.index(frame.format)
+        slot[self.WIDTH] = w
+        slot[self.HEIGHT] = h
+        slot[self.NDIM] = data.ndim
+        slot[self.SHAPE:self.SHAPE + data.ndim] = data.shape
+        slot[self.TIMESTAMP] = self._ns(frame.timestamp)
+        slot[self.RECEIVED] = self._ns(frame.t_received)
+        slot[self.SLOT_SEQ] = seq
+
+        self.seq = seq
+
+        return seq
+
+    def get(self):
+        seq = self.seq
+
+        if seq == 0:
+            return
+
+        i = seq % self.slots
+        slot = self.meta[i + 1].copy()
+
+        if slot[self.SLOT_SEQ] != seq:
+            return
+
+        # The frame is a view into the shared memory, nothing is copied. The
+        # writer may come around the ring again while it is in use, so once
+        # done with it consumers check is_valid() and drop it if it was
+        # overwritten meanwhile:
+        ndim = int(slot[self.NDIM])
+        shape = tuple(int(d) for d in slot[self.SHAPE:self.SHAPE + ndim])
+
+        try:
+            data = self._view(i, shape)
+        except (TypeError, ValueError):
+            return
+
+        fmt = self.FORMATS[slot[self.FORMAT]]
+        size = (int(slot[self.WIDTH]), int(slot[self.HEIGHT]))
+
+        return VideoFrame(data, fmt, size, seq,
+                          self._seconds(slot[self.TIMESTAMP]),
+                          self._seconds(slot[self.RECEIVED]))
+
+    def is_valid(self, seq):
+        # Whether the slot still holds frame seq. The writer invalidates a
+        # slot before writing to it, so a frame read while it was being
+        # rewritten fails this too:
+        slot = self.meta[seq % self.slots + 1]
+
+        return int(slot[self.SLOT_SEQ]) == seq
+
+    @staticmethod
+    def _ns(t):
+        return 0 if t is None else int(t * 1e9)
+
+    @staticmethod
+    def _seconds(ns):
+        return int(ns) / 1e9 if ns else None
+
+    def _view(self, i, shape):
+        return np.ndarray(shape, np.uint8, self.shm.buf,
+                          self.data_offset + i * self.slot_bytes)
+
+    def close(self):
+        self.meta = None
+
+        # Frames handed out earlier may still refer to the memory, it is then
+        # unmapped once they are gone:
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+def _capture(path, size, fps, raw, timeout, conn):
+
+    try:
+        stream = VideoStream.open(path, size, fps, raw=raw, timeout=timeout)
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+
+    try:
+        conn.send(('ready', stream.frame_size))
+        name, slots = conn.recv()
+    except EOFError:
+        stream.release()
+        return
+
+    ring = VideoFrameRing(stream.frame_size, slots, name)
+
+    # The ring keeps counting where the previous process stopped, if there
+    # was one:
+    dropped = ring.dropped
+
+    def publish(frame):
+        ring.put(frame)
+        ring.rate = stream.counter.rate('capture')
+        ring.dropped = dropped + stream.dropped
+
+    stream.subscribe(publish)
+
+    # Runs until it is told to stop, the parent goes away or the capture
+    # thread dies. In the last case the parent restarts the process:
+    try:
+
+        while stream.is_running:
+
+            if conn.poll(VideoProcessStream.POLL_DELAY):
+                conn.recv()
+                break
+
+    except (EOFError, OSError):
+        pass
+    finally:
+        stream.release()
+        ring.close()
+
+
+class VideoProcessStream(object):
+
+    SLOTS = VideoFrameRing.SLOTS
+    OPEN_TIMEOUT = VideoStream.OPEN_TIMEOUT
+    POLL_DELAY = 0.1
+    RETRY_DELAY = 0.01
+    RESTART_DELAY = 1
+    MAX_RESTARTS = 5
+
+    def __init__(self, path='/dev/video0', size=(640, 480), fps=None,
+                 raw=False, slots=SLOTS, timeout=OPEN_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.fps = fps
+        self.raw = raw
+        self.slots = slots
+        self.timeout = timeout
+
+        # Spawned rather than forked, the parent runs Tk and other threads:
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.conn = None
+        self.ring = None
+        self.rings = []
+        self.frame_size = None
+
+        self.thread = None
+        self.stopped = Event()
+        self.frame_lock = Lock()
+        self.frame = None
+        self.seq = 0
+        self.restarts = 0
+        self.error = None
+
+    @classmethod
+    def open(cls, path='/dev/video0', size=(640, 480), fps=None, raw=False,
+             slots=SLOTS, timeout=OPEN_TIMEOUT):
+        stream = cls(path, size, fps, raw, slots, timeout)
+
+        try:
+            stream.start()
+        except Exception:
+            stream.release()
+            raise
+
+        if not stream.wait_ready(timeout):
+            stream.release()
+            raise TimeoutError('Failed to open {p}, timeout {t:.5f} '
+                               'exceeded!'.format(p=path, t=timeout))
+
+        return stream
+
+    @property
+    def is_device(self):
+        return self.path.startswith('/dev/')
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def discarded(self):
+
+        if self.ring is None:
+            return 0
+
+        return self.ring.discarded
+
+    @property
+    def dropped(self):
+
+        if self.ring is None:
+            return 0
+
+        return self.ring.dropped
+
+    def capture_rate(self):
+
+        if self.ring is None:
+            return
+
+        return self.ring.rate
+
+    def start(self):
+
+        if self.thread is not None:
+            return self
+
+        self.stopped.clear()
+        self._spawn()
+
+        self.thread = Thread(target=self._monitor, daemon=True,
+                             name='VideoProcessStream({p})'.format(
+                                 p=self.path))
+        self.thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def release(self):
+        self.stop()
+        self._terminate()
+
+        with self.frame_lock:
+            self.frame = None
+
+        for ring in self.rings:
+            ring.unlink()
+
+        self.rings = []
+        self.ring = None
+
+    def wait_ready(self, timeout=None):
+        t_start = time.time()
+
+        while self.latest() is None:
+
+            if not self.is_running:
+                return False
+
+            if timeout is not None and time.time() - t_start > timeout:
+                return False
+
+            time.sleep(self.RETRY_DELAY)
+
+        return True
+
+    def latest(self):
+
+        if self.ring is None:
+            return self.frame
+
+        with self.frame_lock:
+
+            # The same frame object is returned until a new one arrives, so
+            # what it has decoded or converted so far is reused:
+            if self.ring.seq != self.seq:
+                frame = self.ring.get()
+
+                if frame is not None:
+                    self.seq, self.frame = frame.seq, frame
+
+            return self.frame
+
+    def is_valid(self, frame):
+
+        with self.frame_lock:
+
+            if self.ring is None or self.ring.is_valid(frame.seq):
+                return True
+
+            # Whatever was decoded or converted from the frame may be torn, so
+            # it is not handed out again:
+            if self.frame is frame:
+                self.frame = None
+                self.seq = 0
+
+            return False
+
+    def _spawn(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_capture, daemon=True,
+            args=(self.path, self.size, self.fps, self.raw, self.timeout,
+                  child_conn))
+        self.process.start()
+        child_conn.close()
+
+        if not self.conn.poll(self.timeout + self.RESTART_DELAY):
+            self._terminate()
+            raise TimeoutError('Failed to open {p}, timeout {t:.5f} '
+                               'exceeded!'.format(p=self.path,
+                                                  t=self.timeout))
+
+        try:
+            msg = self.conn.recv()
+        except EOFError:
+            msg = ('error', 'Capture process for {p} exited with code '
+                   '{c}'.format(p=self.path, c=self.process.exitcode))
+
+        if msg[0] == 'error':
+            self._terminate()
+            raise IOError(msg[1])
+
+        frame_size = msg[1]
+
+        # The ring survives restarts as long as the frame size stays the
+        # same, so the sequence numbers carry on where they stopped:
+        if self.ring is None or self.ring.frame_size != frame_size:
+            ring = VideoFrameRing(frame_size, self.slots)
+            ring.seq = self.seq
+            self.rings.append(ring)
+            self.ring = ring
+
+        self.frame_size = frame_size
+        self.conn.send((self.ring.name, self.slots))
+
+    def _terminate(self):
+
+        if self.process is None:
+            return
+
+        try:
+            self.conn.send('stop')
+        except (BrokenPipeError, OSError):
+            pass
+
+        self.process.join(self.POLL_DELAY * 10)
+
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def _monitor(self):
+
+        while not self.stopped.is_set():
+            self.process.join(self.POLL_DELAY)
+
+            if self.process.is_alive() or self.stopped.is_set():
+                continue
+
+            self.error = 'capture process exited with code {c}'.format(
+                c=self.process.exitcode)
+            self._terminate()
+
+            while not self.stopped.is_set():
+
+                if self.restarts >= self.MAX_RESTARTS:
+                    return
+
+                self.restarts += 1
+                self.stopped.wait(self.RESTART_DELAY)
+
+                try:
+                    self._spawn()
+                    break
+                except Exception as e:
+                    self.error = str(e)
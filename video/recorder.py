@@ -0,0 +1,196 @@
+import os
+import time
+from collections import deque
+from threading import Thread, Condition
+
+import cv2
+
+from .exceptions import FrameError
+
+
+class VideoRecorder(object):
+
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    QUEUE_SIZE = 64
+    MJPEG_EXTENSIONS = ('.mjpg', '.mjpeg')
+
+    def __init__(self, filename, fps=30, fourcc='MJPG', queue_size=QUEUE_SIZE,
+                 policy=DROP_OLDEST):
+
+        if policy not in (self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError('Unknown drop policy: {p}'.format(p=policy))
+
+        self.filename = filename
+        self.fps = fps
+        self.fourcc = fourcc
+        self.policy = policy
+
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.cond = Condition()
+        self.stopped = False
+        self.thread = None
+
+        self.writer = None
+        self.file = None
+
+        self.written = 0
+        self.dropped = 0
+        self.corrupt = 0
+        self.error = None
+        self.lag = 0
+        self.max_lag = 0
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def is_mjpeg(self):
+        ext = os.path.splitext(self.filename)[1].lower()
+
+        return ext in self.MJPEG_EXTENSIONS
+
+    @property
+    def pending(self):
+        return len(self.queue)
+
+    def start(self):
+
+        if self.thread is not None:
+            return self
+
+        self.stopped = False
+        self.thread = Thread(target=self._run, daemon=True,
+                             name='VideoRecorder({f})'.format(
+                                 f=self.filename))
+        self.thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+
+        if self.thread is None:
+            return
+
+        # The frames already queued are still written before the file is
+        # closed:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+        self.thread.join(timeout)
+        self.thread = None
+
+    def put(self, frame):
+
+        with self.cond:
+
+            if self.stopped:
+                return False
+
+            if len(self.queue) >= self.queue_size:
+                self.dropped += 1
+
+                if self.policy == self.DROP_NEWEST:
+                    return False
+
+                self.queue.popleft()
+
+            self.queue.append((time.monotonic(), frame))
+            self.cond.notify()
+
+        return True
+
+    def status(self):
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'corrupt': self.corrupt,
+            'pending': self.pending,
+            'lag': round(1000 * self.lag, 3),
+            'max_lag': round(1000 * self.max_lag, 3),
+            'error': self.error,
+        }
+
+    def _run(self):
+
+        try:
+
+            while True:
+
+                with self.cond:
+
+                    while not self.queue and not self.stopped:
+                        self.cond.wait()
+
+                    if not self.queue:
+                        return
+
+                    t_put, frame = self.queue.popleft()
+
+                # Frames which cannot be decoded are left out:
+                try:
+                    self._write(frame)
+                except FrameError:
+                    self.corrupt += 1
+                    continue
+
+                self.written += 1
+                self.lag = time.monotonic() - t_put
+                self.max_lag = max(self.max_lag, self.lag)
+
+        except Exception as e:
+
+            # The recording is over, and put() refuses frames from now on:
+            with self.cond:
+                self.error = str(e)
+                self.stopped = True
+                self.queue.clear()
+
+        finally:
+            self._close()
+
+    def _write(self, frame):
+
+        # Raw MJPEG files are just concatenated JPEG images. Compressed frames
+        # go there as they came from the device, without decoding and
+        # re-encoding them:
+        if self.is_mjpeg:
+
+            if self.file is None:
+                self.file = open(self.filename, 'wb')
+
+            if frame.is_compressed:
+                buf = frame.data
+            else:
+                buf = cv2.imencode('.jpg', frame.bgr())[1]
+
+            self.file.write(buf.tobytes())
+
+            return
+
+        data = frame.bgr()
+
+        if self.writer is None:
+            h, w = data.shape[:2]
+            self.writer = cv2.VideoWriter(
+                self.filename, cv2.VideoWriter_fourcc(*self.fourcc),
+                self.fps, (w, h))
+
+            if not self.writer.isOpened():
+                raise IOError('Failed to open {f} for writing'.format(
+                    f=self.filename))
+
+        self.writer.write(data)
+
+    def _close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
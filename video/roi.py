@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class VideoROI(object):
+
+    HIST_BINS = 16
+    SATURATION_LEVEL = 255
+
+    def __init__(self, roi_list):
+        # ROIs are relative [xmin, ymin, xmax, ymax] boxes, as stored in the
+        # settings profiles:
+        self.roi_list = [list(roi) for roi in roi_list]
+        self.size = None
+        self.boxes = []
+        self.slices = []
+        self.bounds = None
+
+    def __len__(self):
+        return len(self.roi_list)
+
+    def update(self, size):
+
+        if size == self.size:
+            return
+
+        w, h = size
+        self.size = size
+        self.boxes = []
+        self.slices = []
+
+        for roi in self.roi_list:
+            xmin = min(max(int(roi[0] * w), 0), w - 1)
+            ymin = min(max(int(roi[1] * h), 0), h - 1)
+            xmax = min(max(int(roi[2] * w), xmin + 1), w)
+            ymax = min(max(int(roi[3] * h), ymin + 1), h)
+
+            self.boxes.append((xmin, ymin, xmax, ymax))
+            self.slices.append((slice(ymin, ymax), slice(xmin, xmax)))
+
+        # The bounding box of all ROIs, the only part of a frame the
+        # statistics have to look at:
+        if self.boxes:
+            self.bounds = (min(b[0] for b in self.boxes),
+                           min(b[1] for b in self.boxes),
+                           max(b[2] for b in self.boxes),
+                           max(b[3] for b in self.boxes))
+        else:
+            self.bounds = None
+
+    def pixel_boxes(self, size):
+        self.update(size)
+
+        return list(self.boxes)
+
+    def views(self, frame, fmt=None):
+        self.update(frame.size)
+        data = frame.decode().data if fmt is None else frame.to(fmt)
+
+        for s in self.slices:
+            yield data[s]
+
+    def crops(self, frame):
+        self.update(frame.size)
+
+        for box in self.boxes:
+            yield frame.crop(box)
+
+    def stats(self, frame):
+        self.update(frame.size)
+
+        if self.bounds is None:
+            return []
+
+        # Gray levels and the Laplacian are computed once over the ROIs'
+        # bounding box, every ROI is then reduced from a view into them:
+        xmin, ymin, xmax, ymax = self.bounds
+        gray = frame.gray()[ymin:ymax, xmin:xmax]
+        laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+
+        stats = []
+
+        for x0, y0, x1, y1 in self.boxes:
+            s = (slice(y0 - ymin, y1 - ymin), slice(x0 - xmin, x1 - xmin))
+            roi = gray[s]
+
+            hist = cv2.calcHist([roi], [0], None, [self.HIST_BINS], [0, 256])
+            saturated = np.count_nonzero(roi >= self.SATURATION_LEVEL)
+
+            stats.append({
+                'mean': float(roi.mean()),
+                'hist': hist.ravel().astype(int).tolist(),
+                'sharpness': float(laplacian[s].var()),
+                'saturated': saturated / roi.size,
+            })
+
+        return stats
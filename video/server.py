@@ -0,0 +1,252 @@
+import json
+import logging
+from threading import Thread, Condition, Lock, Event
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import cv2
+
+from .exceptions import SettingsError
+
+
+class VideoStreamHandler(BaseHTTPRequestHandler):
+
+    INDEX = b'<html><body><img src="/stream"></body></html>'
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+
+        if path == '/':
+            self.send_body(self.INDEX, 'text/html')
+        elif path == '/stream':
+            self.send_stream()
+        elif path == '/snapshot.jpg':
+            self.send_snapshot()
+        elif path == '/settings':
+            self.send_settings()
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type, code=200):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self):
+        server = self.server.video
+        boundary = server.BOUNDARY.encode('ascii')
+
+        self.send_response(200)
+        self.send_header('Content-Type',
+                         'multipart/x-mixed-replace; boundary=' +
+                         server.BOUNDARY)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        seq = 0
+        data = None
+        server.add_client()
+
+        # Every client gets the newest frame whenever it is ready for one, a
+        # slow client just skips frames instead of holding the others up:
+        try:
+
+            while not server.stopped.is_set():
+                result = server.wait_jpeg(seq)
+
+                # A closed connection only shows when writing to it, so while
+                # the source stalls the last frame is sent again (or, before
+                # the first one, an empty line of preamble):
+                if result is None:
+
+                    if server.stopped.is_set():
+                        break
+
+                    if data is None:
+                        self.wfile.write(b'\r\n')
+                        continue
+
+                else:
+                    seq, data = result
+
+                self.wfile.write(
+                    b'--' + boundary + b'\r\n'
+                    b'Content-Type: image/jpeg\r\n'
+                    b'Content-Length: ' + str(len(data)).encode('ascii') +
+                    b'\r\n\r\n')
+                self.wfile.write(data)
+                self.wfile.write(b'\r\n')
+
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            server.remove_client()
+
+    def send_snapshot(self):
+        result = self.server.video.wait_jpeg(0)
+
+        if result is None:
+            self.send_error(503)
+            return
+
+        self.send_body(result[1], 'image/jpeg')
+
+    def send_settings(self):
+        try:
+            state = self.server.video.settings_state()
+        except SettingsError as e:
+            body = json.dumps({'error': str(e)}).encode('utf-8')
+            self.send_body(body, 'application/json', 500)
+            return
+
+        self.send_body(json.dumps(state, indent=2).encode('utf-8'),
+                       'application/json')
+
+    def log_message(self, fmt, *args):
+        self.server.video.logger.debug('{a} :: {m}'.format(
+            a=self.address_string(), m=fmt % args))
+
+
+class VideoStreamServer(object):
+
+    HOST = '127.0.0.1'
+    PORT = 8080
+    QUALITY = 85
+    BOUNDARY = 'frame'
+    WAIT_TIMEOUT = 1
+
+    def __init__(self, stream, settings=None, host=HOST, port=PORT,
+                 quality=QUALITY, logger=None):
+        self.stream = stream
+        self.settings = settings
+        self.quality = quality
+        self.logger = logger or logging.getLogger()
+
+        self.cond = Condition()
+        self.frame = None
+        self.clients = 0
+        self.stopped = Event()
+        self.thread = None
+
+        self.encode_lock = Lock()
+        self.encoded = (0, None)
+
+        self.httpd = ThreadingHTTPServer((host, port), VideoStreamHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.video = self
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+
+        if self.thread is not None:
+            return self
+
+        self.stopped.clear()
+        self.stream.subscribe(self.put)
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True,
+                             name='VideoStreamServer({h}:{p})'.format(
+                                 h=self.address[0], p=self.address[1]))
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+
+        if self.thread is None:
+            return
+
+        self.stream.unsubscribe(self.put)
+        self.stopped.set()
+
+        with self.cond:
+            self.cond.notify_all()
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        self.thread = None
+
+    def serve_forever(self):
+        self.start()
+
+        try:
+            self.thread.join()
+        finally:
+            self.stop()
+
+    def put(self, frame):
+        # Called on the capture thread for every frame, nothing is encoded
+        # here and nothing at all while there are no clients:
+        with self.cond:
+            self.frame = frame
+            self.cond.notify_all()
+
+    def add_client(self):
+
+        with self.cond:
+            self.clients += 1
+
+    def remove_client(self):
+
+        with self.cond:
+            self.clients -= 1
+
+    def wait_jpeg(self, seq, timeout=WAIT_TIMEOUT):
+        # Waits for a frame newer than seq, returns its seq and JPEG data:
+        with self.cond:
+            self.cond.wait_for(
+                lambda: self.stopped.is_set() or (
+                    self.frame is not None and self.frame.seq != seq),
+                timeout)
+            frame = self.frame
+
+        if frame is None or frame.seq == seq or self.stopped.is_set():
+            return
+
+        return frame.seq, self.jpeg(frame)
+
+    def jpeg(self, frame):
+
+        # A frame is encoded once, by the first client which needs it, and
+        # MJPEG frames from the device are passed on as they came:
+        with self.encode_lock:
+            seq, data = self.encoded
+
+            if seq != frame.seq or data is None:
+
+                if frame.is_compressed:
+                    data = frame.data.tobytes()
+                else:
+                    data = cv2.imencode(
+                        '.jpg', frame.bgr(),
+                        [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1].tobytes()
+
+                self.encoded = (frame.seq, data)
+
+            return data
+
+    def settings_state(self):
+        state = {
+            'path': self.stream.path,
+            'frame_size': list(self.stream.frame_size),
+            'clients': self.clients,
+            'controls': None,
+            'resolutions': None,
+        }
+
+        # Files have no settings:
+        if self.settings is not None:
+            state['controls'] = self.settings.get()
+            state['resolutions'] = [list(r) for r in
+                                    self.settings.get_resolutions()]
+
+        return state
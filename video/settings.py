@@ -1,45 +1,94 @@
-import re
+import time
+import copy
 import glob
 import logging
-from subprocess import Popen, TimeoutExpired, PIPE
+from threading import RLock
 
 from .exceptions import SettingsError
+from .backends import IoctlBackend, V4L2CtlBackend
 
 
 class VideoDeviceSettings(object):
 
-    def __init__(self, dev='/dev/video0', timeout=None, logger=None):
+    def __init__(self, dev='/dev/video0', timeout=None, logger=None,
+                 backend=None, cache_ttl=None):
         self.dev = dev
         self.timeout = timeout
         self.logger = logger or logging.getLogger()
+        self.backend = backend or self._create_backend()
+        self.cache_ttl = cache_ttl
+        self.lock = RLock()
+        self.invalidate()
 
-    def get(self):
+    def _create_backend(self):
 
         try:
-            set_str = self._exec_shell(['v4l2-ctl', '-d', self.dev, '-L'])
-            set_list = self._str_to_list(set_str)
-        except:
-            raise SettingsError('Failed to get device settings.')
+            return IoctlBackend(self.dev)
+        except OSError as e:
+            self.logger.warning('{d} :: ioctl backend unavailable ({e}), '
+                                'falling back to v4l2-ctl'.format(
+                                    d=self.dev, e=e))
+
+        return V4L2CtlBackend(self.dev, self.timeout)
 
-        return set_list
+    def close(self):
+        self.backend.close()
 
-    def get_resolutions(self):
+    def get_info(self):
 
         try:
-            formats = self._exec_shell(
-                ['v4l2-ctl', '-d', self.dev, '--list-formats-ext'])
+            return self.backend.get_info()
         except:
-            raise SettingsError('Failed to get device resolutions.')
+            raise SettingsError('Failed to get device info.')
+
+    def invalidate(self):
+
+        with self.lock:
+            self.invalidate_controls()
+            self.resolutions = None
+
+    def cache_expired(self):
+
+        if self.controls is None:
+            return True
+
+        if self.cache_ttl is None:
+            return False
+
+        return time.time() - self.t_controls > self.cache_ttl
+
+    def get(self, refresh=False):
+
+        with self.lock:
 
-        str_list = re.findall(r'\s(\d+x\d+)', formats)
-        str_list = list(set(str_list))
-        res_list = []
+            if refresh or self.cache_expired():
 
-        for s in str_list:
-            w, h = s.split('x')
-            res_list.append((int(w), int(h)))
+                try:
+                    set_list = self.backend.get_controls()
+                except:
+                    raise SettingsError('Failed to get device settings.')
 
-        return sorted(res_list, key=lambda x: x[0])
+                self.controls = {s['name']: s for s in set_list}
+                self.t_controls = time.time()
+
+            set_list = copy.deepcopy(list(self.controls.values()))
+
+            return sorted(set_list, key=lambda x: x['name'])
+
+    def get_resolutions(self, refresh=False):
+
+        with self.lock:
+
+            if refresh or self.resolutions is None:
+
+                try:
+                    res_list = self.backend.get_resolutions()
+                except:
+                    raise SettingsError('Failed to get device resolutions.')
+
+                self.resolutions = sorted(res_list, key=lambda x: x[0])
+
+            return list(self.resolutions)
 
     def reset_to_defaults(self):
         settings = self.get()
@@ -54,13 +103,18 @@ class VideoDeviceSettings(object):
         self.set(settings)
 
     def set(self, settings):
+
+        with self.lock:
+            self._set(settings)
+
+    def _set(self, settings):
         bool_sets = []
         menu_sets = []
         other_sets = []
 
         for s_entry in settings:
 
-            if s_entry.get('flags') == 'inactive':
+            if self.is_inactive(s_entry):
                 continue
 
             s_type = s_entry.get('type')
@@ -75,81 +129,84 @@ class VideoDeviceSettings(object):
         # The order does matter. First apply bool settings, then menu settings,
         # and finally the other ones:
         for vals in (bool_sets, menu_sets, other_sets):
+            self._set_changed(vals)
 
-            if not vals:
-                continue
+    def _set_changed(self, vals):
 
-            s_str = self._vals_to_str(vals)
-            self.logger.info('{d} :: {s}'.format(d=self.dev, s=s_str))
-            self._exec_shell(['v4l2-ctl', '-d', self.dev, '--set-ctrl', s_str])
+        if not vals:
+            return
 
-    def exposure_manual(self):
+        try:
+            self.get()
+        except SettingsError:
+            # Without the current state nothing can be skipped, so just push
+            # all the given values to the device:
+            self.invalidate()
 
-        # This is a hack. It turns the exposure into manual mode:
-        for val in ('3', '1'):
-            self.set([{'name': 'exposure_auto', 'value': val}])
+        vals = [s for s in vals if self.is_changed(s)]
 
-    def _exec_shell(self, args):
+        if not vals:
+            return
 
-        proc = Popen(args, stdout=PIPE, stderr=PIPE)
+        s_str = self.backend.vals_to_str(vals)
+        self.logger.info('{d} :: {s}'.format(d=self.dev, s=s_str))
 
         try:
-            outs, errs = proc.communicate(timeout=self.timeout)
-        except TimeoutExpired:
-            proc.kill()
+            self.backend.set_controls(vals)
+        except:
+            self.invalidate()
             raise
 
-        if errs:
-            raise SettingsError(errs.decode('utf-8'))
+        self.update_cache(vals)
 
-        return outs.decode('utf-8') or None
+        # Switching bool and menu controls (e.g. auto modes) changes the flags
+        # and values of the dependent controls, so they are read again before
+        # the next group is compared against them:
+        if any(s.get('type') in ('bool', 'menu') for s in vals):
+            self.invalidate_controls()
 
-    def _str_to_list(self, set_str):
-        set_list = []
-        lines = [i.strip() for i in set_str.strip().split('\n')]
+    def is_changed(self, entry):
 
-        for line in lines:
-            # Check if menu entry:
-            menu_entry = re.findall(r'^(\d+):\s(.+)$', line)
+        if self.controls is None:
+            return True
 
-            if menu_entry:
-                val, desc = menu_entry[0]
+        cached = self.controls.get(entry['name'])
 
-                menu = set_list[-1].get('menu', {})
-                menu[int(val)] = desc
+        if cached is None:
+            return True
 
-                set_list[-1]['menu'] = menu
-            else:
-                # Find parameter name and type (int, bool, or menu):
-                name_type = re.findall(r'^(\w+)\s*.*\s\((\w+)\)', line)
+        return str(cached.get('value')) != str(entry['value'])
 
-                if not name_type:
-                    continue
+    def update_cache(self, settings):
 
-                name, param_type = name_type[0]
-                param_entry = {
-                    'name': name,
-                    'type': param_type,
-                }
-                params = re.findall(r'(\w+)=(\S+)', line)
+        if self.controls is None:
+            return
 
-                for name, val in params:
+        for s in settings:
+            cached = self.controls.get(s['name'])
 
-                    try:
-                        param_entry[name] = int(val)
-                    except ValueError:
-                        param_entry[name] = val
+            if cached is None:
+                continue
 
-                set_list.append(param_entry)
+            try:
+                cached['value'] = int(s['value'])
+            except ValueError:
+                cached['value'] = s['value']
 
-        return sorted(set_list, key=lambda x: x['name'])
+    def invalidate_controls(self):
+        self.controls = None
+        self.t_controls = None
 
-    def _vals_to_str(self, settings):
-        toks = ['{n}={v}'.format(n=s['name'], v=s['value']) for s in settings]
+    def exposure_manual(self):
 
-        return ','.join(toks)
+        # This is a hack. It turns the exposure into manual mode:
+        for val in ('3', '1'):
+            self.set([{'name': 'exposure_auto', 'value': val}])
+
+    @staticmethod
+    def is_inactive(entry):
+        return 'inactive' in entry.get('flags', '').split(',')
 
     @staticmethod
     def device_list():
         return sorted(glob.glob('/dev/video*'))
-
@@ -1,36 +1,260 @@
 import time
+import statistics
+from collections import deque
+from threading import Thread, Lock, Event
 
 import cv2
 
+from .frame import VideoFrame
+from .counter import VideoFrameCounter
+
 
 class VideoStream(object):
 
-    def __init__(self, path='/dev/video0', size=(640, 480), fps=None):
+    BUFFER_SIZE = 3
+    RETRY_DELAY = 0.01
+    OPEN_TIMEOUT = 10
+    OPEN_RETRY_DELAY = 0.1
+    MAX_FRAME_AGE = 10
+    PERIOD_SAMPLES = 9
+
+    def __init__(self, path='/dev/video0', size=(640, 480), fps=None,
+                 counter=None, raw=False):
         self.path = path
         self.size = size
         self.fps = fps
+        self.raw = raw
+        self.counter = counter or VideoFrameCounter()
         self.cap = self._capture_stream()
 
+        self.thread = None
+        self.stopped = Event()
+        self.frame_lock = Lock()
+        self.frame = None
+        self.seq = 0
+        self.discarded = 0
+        self.dropped = 0
+        self.timestamp = None
+        self.t_received = None
+        self.period = self.frame_period()
+        self.deltas = deque(maxlen=self.PERIOD_SAMPLES)
+        self.consumers = []
+
     def __del__(self):
         cap = getattr(self, 'cap', None)
 
         if cap is not None:
             cap.release()
 
+    @classmethod
+    def open(cls, path='/dev/video0', size=(640, 480), fps=None,
+             counter=None, raw=False, timeout=OPEN_TIMEOUT):
+        # A device which has just been released by another capture may be
+        # busy for a moment, so keep trying until it delivers a frame:
+        t_start = time.time()
+
+        while True:
+            stream = cls(path, size, fps, counter, raw)
+
+            if stream.is_opened():
+                stream.start()
+
+                if stream.wait_ready(timeout - (time.time() - t_start)):
+                    return stream
+
+            stream.release()
+
+            if time.time() - t_start > timeout:
+                raise TimeoutError('Failed to open {p}, timeout {t:.5f} '
+                                   'exceeded!'.format(p=path, t=timeout))
+
+            time.sleep(cls.OPEN_RETRY_DELAY)
+
+    @property
+    def is_device(self):
+        return self.path.startswith('/dev/')
+
+    @property
+    def is_seekable(self):
+        return False
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+
+        if self.thread is not None:
+            return self
+
+        self.stopped.clear()
+        self.thread = Thread(target=self._update, daemon=True,
+                             name='VideoStream({p})'.format(p=self.path))
+        self.thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def release(self):
+        self.stop()
+        self.cap.release()
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def wait_ready(self, timeout=None):
+        t_start = time.time()
+
+        while self.seq == 0:
+
+            if not self.is_running:
+                return False
+
+            if timeout is not None and time.time() - t_start > timeout:
+                return False
+
+            time.sleep(self.RETRY_DELAY)
+
+        return True
+
+    def subscribe(self, consumer):
+        self.consumers.append(consumer)
+
+    def unsubscribe(self, consumer):
+
+        try:
+            self.consumers.remove(consumer)
+        except ValueError:
+            pass
+
+    def latest(self):
+
+        with self.frame_lock:
+            return self.frame
+
+    def is_valid(self, frame):
+        # Frames are never overwritten here, see VideoProcessStream:
+        return True
+
+    def _update(self):
+        # Files are not paced by a device clock, so play them back at their
+        # nominal frame rate instead of decoding as fast as possible:
+        period = None
+
+        if not self.is_device:
+            fps = self.fps or self.cap.get(cv2.CAP_PROP_FPS)
+            period = 1 / fps if fps else None
+
+        t_next = time.time()
+
+        while not self.stopped.is_set():
+
+            with self.counter.measure('grab'):
+                success = self.grab()
+
+            if success:
+
+                with self.counter.measure('decode'):
+                    success, frame = self.cap.retrieve()
+
+            if not success:
+                self.stopped.wait(self.RETRY_DELAY)
+                continue
+
+            frame = self._frame(frame)
+
+            with self.frame_lock:
+                self.frame = frame
+                self.seq = frame.seq
+
+            # Consumers run on the capture thread for every frame, so they
+            # should only hand it over (e.g. to a queue) and return:
+            for consumer in list(self.consumers):
+                consumer(frame)
+
+            self.counter.tick('capture')
+
+            if period is not None:
+                t_next = max(t_next + period, time.time() - period)
+                self.stopped.wait(max(t_next - time.time(), 0))
+
     def _capture_stream(self):
         cap = cv2.VideoCapture(self.path)
 
-        if self.path.startswith('/dev/'):
+        if self.is_device:
             width, height = self.size
             cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
             cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-            cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.BUFFER_SIZE)
+
+        # In raw mode the compressed MJPEG buffers are passed through as they
+        # are, so that each consumer decodes them at the scale it needs. This
+        # only works if the device actually delivers MJPEG:
+        if self.raw:
+            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+
+            if self.is_device and fourcc == cv2.VideoWriter_fourcc(*'MJPG'):
+                cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            else:
+                self.raw = False
+
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
 
         return cap
 
+    def _frame(self, data):
+        meta = (self.seq + 1, self.timestamp, self.t_received)
+
+        if self.raw and data.ndim < 3:
+            return VideoFrame(data.reshape(-1), 'mjpeg', self.frame_size,
+                              *meta)
+
+        return VideoFrame(data, 'bgr', None, *meta)
+
     def grab(self):
-        return self.cap.grab()
+
+        if not self.cap.grab():
+            return False
+
+        t_received = time.monotonic()
+        timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+        if timestamp <= 0:
+            timestamp = None
+
+        # Frames the driver never delivered show up as gaps between the
+        # timestamps of consecutive grabs. Cameras lower their frame rate
+        # in low light (exposure_auto_priority), so the gaps are measured
+        # against the median of the recent frame intervals rather than the
+        # nominal one:
+        if timestamp is not None and self.timestamp is not None:
+            delta = timestamp - self.timestamp
+            period = statistics.median(self.deltas) if self.deltas \
+                else self.period
+
+            if period:
+                gap = round(delta / period) - 1
+
+                if gap > 0:
+                    self.dropped += gap
+
+            if delta > 0:
+                self.deltas.append(delta)
+
+        self.timestamp = timestamp
+        self.t_received = t_received
+
+        return True
 
     def retrieve(self):
         success, frame = self.cap.retrieve()
@@ -38,36 +262,97 @@ class VideoStream(object):
         if not success:
             return
 
-        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame = self._frame(frame)
+        self.seq = frame.seq
+
+        return frame
+
+    def drain(self):
+        # Grab (without decoding) the frames queued by the driver until the
+        # grabbed one is fresh, so that a following retrieve() decodes only
+        # the newest frame. Returns the number of discarded frames, or None
+        # if nothing could be grabbed:
+        if not self.grab():
+            return
+
+        discarded = 0
+
+        if not self.is_device:
+            return discarded
+
+        period = self.frame_period()
+
+        for _ in range(self.BUFFER_SIZE):
+            age = self.frame_age()
+
+            if age is None or period is None or age < period:
+                break
+
+            if not self.grab():
+                break
+
+            discarded += 1
+
+        self.discarded += discarded
+
+        return discarded
+
+    def capture_rate(self):
+        return self.counter.rate('capture')
+
+    def frame_rate(self):
+        return self.fps or self.cap.get(cv2.CAP_PROP_FPS) or None
+
+    def frame_period(self):
+        fps = self.frame_rate()
+
+        if not fps:
+            return
+
+        return 1 / fps
+
+    def frame_age(self):
+        # V4L2 drivers stamp buffers with CLOCK_MONOTONIC, which is also the
+        # clock behind time.monotonic(). Ages which make no sense (negative
+        # or in the order of minutes) mean the timestamps are not comparable:
+        if self.timestamp is None:
+            return
+
+        age = time.monotonic() - self.timestamp
 
-    def read(self, size=None, timeout=None):
+        if not 0 <= age < self.MAX_FRAME_AGE:
+            return
+
+        return age
+
+    def read(self, size=None, timeout=None, drain=True):
         t_start = time.time()
 
         while True:
-            t_fetch_start = time.time()
-            success, frame = self.cap.read()
-            t_elapsed = time.time() - t_start
 
-            if timeout and t_elapsed > timeout:
-                raise TimeoutError('Failed to read from {p}, timeout {t:.5f} '
-                                   'exceeded!'.format(p=self.path, t=timeout))
+            if drain:
+                success = self.drain() is not None
+            else:
+                success = self.grab()
 
-            if not success:
-                continue
+            if success:
+                break
+
+            if timeout is None:
+                return
 
-            if self.fps is not None:
-                t_fetch_elapsed = time.time() - t_fetch_start
+            if time.time() - t_start > timeout:
+                raise TimeoutError('Failed to read from {p}, timeout {t:.5f} '
+                                   'exceeded!'.format(p=self.path, t=timeout))
 
-                if t_fetch_elapsed < 0.25 / self.fps:
-                    # It seems this is a buffered frame, try fetching again...
-                    continue
+            time.sleep(self.RETRY_DELAY)
 
-            break
+        frame = self.retrieve()
 
-        if size is not None:
-            frame = cv2.resize(frame, size)
+        if frame is None or size is None:
+            return frame
 
-        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return frame.resize(size)
 
     @staticmethod
     def draw_box(frame, box, color=(0, 255, 0), thickness=2):
@@ -90,10 +375,9 @@ class VideoStream(object):
     def save(frame, filename, size=None):
 
         if size is not None:
-            frame = cv2.resize(frame, size)
+            frame = frame.resize(size)
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(filename, frame)
+        cv2.imwrite(filename, frame.bgr())
 
     @staticmethod
     def show(frame, title=None):
@@ -101,10 +385,8 @@ class VideoStream(object):
         if frame is None:
             return
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
         cv2.namedWindow(title, cv2.WINDOW_NORMAL)
-        cv2.imshow(title, frame)
+        cv2.imshow(title, frame.bgr())
 
     @staticmethod
     def is_key_pressed(key):
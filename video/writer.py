@@ -0,0 +1,99 @@
+from queue import Queue
+from threading import Thread, Condition, Event
+
+
+class VideoSettingsWriter(object):
+
+    def __init__(self, settings, rate=10):
+        self.settings = settings
+        self.rate = rate
+        self.errors = Queue()
+
+        self.thread = None
+        self.cond = Condition()
+        self.stopped = Event()
+        self.pending = {}
+        self.writing = False
+        self.written = 0
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+
+        if self.thread is not None:
+            return self
+
+        self.stopped.clear()
+        self.thread = Thread(target=self._run, daemon=True,
+                             name='VideoSettingsWriter({d})'.format(
+                                 d=self.settings.dev))
+        self.thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+
+        if self.thread is None:
+            return
+
+        # Whatever is still pending gets flushed before the thread exits:
+        with self.cond:
+            self.stopped.set()
+            self.cond.notify_all()
+
+        self.thread.join(timeout)
+        self.thread = None
+
+    def flush(self, timeout=None):
+        # Waits until everything put so far has reached the device. Returns
+        # False on timeout:
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: not self.pending and not self.writing, timeout)
+
+    def put(self, entry):
+        self.put_many([entry])
+
+    def put_many(self, entries):
+
+        with self.cond:
+
+            # Only the latest value of each control is kept, so a slider drag
+            # collapses into one write per flush:
+            for entry in entries:
+                self.pending.pop(entry['name'], None)
+                self.pending[entry['name']] = dict(entry)
+
+            self.cond.notify_all()
+
+    def _run(self):
+        period = 1 / self.rate if self.rate else 0
+
+        while True:
+
+            with self.cond:
+
+                while not self.pending and not self.stopped.is_set():
+                    self.cond.wait()
+
+                if not self.pending:
+                    return
+
+                batch = list(self.pending.values())
+                self.pending = {}
+                self.writing = True
+
+            try:
+                self.settings.set(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.errors.put(e)
+            finally:
+
+                with self.cond:
+                    self.writing = False
+                    self.cond.notify_all()
+
+            self.stopped.wait(period)